@@ -0,0 +1,158 @@
+"""
+Answer Cache
+Reuse answers to repeated questions.
+
+A question hits the cache when its normalised text matches a cached one
+exactly, or, if a similarity threshold is set, when its embedding is within
+that cosine similarity of a cached question's. Entries expire after a TTL and
+the least recently used are evicted beyond max_entries.
+
+Near-duplicate matching is off by default. Cosine similarities cluster
+differently per embedding model (ada-002 scores most related questions above
+0.9), so questions that differ in one entity ("... in dogs?" / "... in
+cats?") can match; the threshold has to be chosen for the model in use.
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import Any, List, Optional, Tuple
+import logging
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+logger = logging.getLogger(__name__)
+
+_TRAILING_PUNCTUATION = re.compile(r'[\s?.!]+$')
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation"""
+    return _TRAILING_PUNCTUATION.sub('', " ".join(question.lower().split()))
+
+
+@dataclass
+class _CacheEntry:
+    response: Any
+    vector: Optional[Any]
+    created: float
+
+
+class AnswerCache:
+    """Thread-safe LRU + TTL cache of ChatResponses keyed by question"""
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        ttl_seconds: Optional[float] = 3600,
+        similarity_threshold: Optional[float] = None
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # None or > 1 disables near-duplicate matching (see the module docstring)
+        self.similarity_threshold = similarity_threshold
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Stacked unit vectors of the entries, rebuilt lazily after changes
+        self._matrix = None
+        self._matrix_keys: List[str] = []
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def semantic(self) -> bool:
+        return HAS_NUMPY and self.similarity_threshold is not None and self.similarity_threshold <= 1.0
+
+    def _expired(self, entry: _CacheEntry, now: float) -> bool:
+        return self.ttl_seconds is not None and now - entry.created > self.ttl_seconds
+
+    def _unit(self, vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _nearest(self, vector) -> Tuple[Optional[str], float]:
+        if self._matrix is None:
+            keys = [key for key, entry in self._entries.items() if entry.vector is not None]
+            if not keys:
+                return None, 0.0
+            self._matrix = np.stack([self._entries[key].vector for key in keys])
+            self._matrix_keys = keys
+        scores = self._matrix @ self._unit(vector)
+        best = int(np.argmax(scores))
+        return self._matrix_keys[best], float(scores[best])
+
+    def get_exact(self, question: str):
+        """
+        Cached response for the same normalised question, or None.
+        Needs no embedding, so check it before computing one; a miss here
+        is not counted, as get() follows.
+        """
+        key = normalize_question(question)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or self._expired(entry, time.time()):
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return self._hit(entry, 'exact', 1.0)
+
+    def get(self, question: str, vector=None):
+        """
+        Cached response for a question, or None.
+        Pass the question's embedding to also match near-duplicates.
+        Hits are returned as copies with metadata['cache'] set.
+        """
+        key = normalize_question(question)
+        now = time.time()
+        with self._lock:
+            match, similarity = key, 1.0
+            entry = self._entries.get(key)
+            if entry is None and vector is not None and self.semantic:
+                match, similarity = self._nearest(vector)
+                if match is not None and similarity >= self.similarity_threshold:
+                    entry = self._entries[match]
+
+            if entry is None or self._expired(entry, now):
+                if entry is not None:
+                    self._remove(match)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(match)
+            self.hits += 1
+
+        return self._hit(entry, 'exact' if match == key else 'semantic', similarity)
+
+    def _hit(self, entry: _CacheEntry, match: str, similarity: float):
+        metadata = dict(entry.response.metadata or {})
+        metadata['cache'] = {'match': match, 'similarity': round(similarity, 4)}
+        return replace(entry.response, metadata=metadata)
+
+    def put(self, question: str, response, vector=None):
+        key = normalize_question(question)
+        unit = self._unit(vector) if vector is not None and self.semantic else None
+        with self._lock:
+            self._entries[key] = _CacheEntry(response=response, vector=unit, created=time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def _remove(self, key: str):
+        self._entries.pop(key, None)
+        self._matrix = None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
@@ -0,0 +1,122 @@
+"""
+Pipeline Benchmark
+Throughput and latency percentiles of the whole chatbot (retrieval, prompt
+assembly, LLM) against the local stand-in server, so load tests run offline.
+
+    python -m chatbot.benchmark --documents-dir pdfs --queries 200 --concurrency 16 \
+        --latency 0.3 --token-rate 40
+
+The stub answers chat completions after --latency seconds and then streams
+--completion-tokens tokens at --token-rate tokens per second; embeddings use
+the local hashing model, so only the LLM is simulated.
+
+Throughput and latency percentiles cover successful queries only; the run
+exits with status 1 if any query failed.
+"""
+
+import argparse
+import asyncio
+import sys
+import tempfile
+import time
+from typing import List
+import logging
+
+from chatbot.rag_chatbot import RAGChatbot
+from chatbot.stub_server import StubServer
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_QUESTIONS = [
+    "What are the main cannabinoids found in cannabis?",
+    "What dose of CBD was used in dogs?",
+    "How is CBDa absorbed compared to CBD in animals?",
+    "What side effects were reported in horses?",
+    "What role does myrcene play in the entourage effect?",
+    "Which studies measured cannabinoid plasma levels in cats?",
+    "What are the therapeutic applications of CBD for pain?",
+    "How do terpenes interact with cannabinoid receptors?",
+]
+
+
+def benchmark_questions(count: int) -> List[str]:
+    """count distinct questions (numbered, so the answer cache does not short-circuit them)"""
+    return [
+        f"{SAMPLE_QUESTIONS[i % len(SAMPLE_QUESTIONS)]} (#{i})"
+        for i in range(count)
+    ]
+
+
+def run_threaded(chatbot: RAGChatbot, questions: List[str], concurrency: int) -> int:
+    """Answer questions with query_many; returns the number of failures"""
+    responses = chatbot.query_many(questions, max_concurrency=concurrency)
+    return sum(1 for response in responses if response.metadata.get('error'))
+
+
+async def _run_async(chatbot: RAGChatbot, questions: List[str], concurrency: int) -> int:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def answer(question: str):
+        async with semaphore:
+            return await chatbot.aquery(question)
+
+    responses = await asyncio.gather(*(answer(question) for question in questions))
+    return sum(1 for response in responses if response.metadata.get('error'))
+
+
+def run_async(chatbot: RAGChatbot, questions: List[str], concurrency: int) -> int:
+    """Answer questions with concurrent aquery calls; returns the number of failures"""
+    return asyncio.run(_run_async(chatbot, questions, concurrency))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the RAG pipeline against the stub LLM server")
+    parser.add_argument('--documents-dir', default="pdfs")
+    parser.add_argument('--vector-store-dir', default=None, help="defaults to a temporary directory")
+    parser.add_argument('--vector-store-type', default="numpy")
+    parser.add_argument('--embedding-model', default="local-hashing")
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--mode', choices=["threads", "async"], default="threads")
+    parser.add_argument('--latency', type=float, default=0.2, help="stub time to first token (seconds)")
+    parser.add_argument('--token-rate', type=float, default=50.0, help="stub completion tokens per second")
+    parser.add_argument('--completion-tokens', type=int, default=64)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    with tempfile.TemporaryDirectory() as tmp, StubServer(
+        latency=args.latency, token_rate=args.token_rate, completion_tokens=args.completion_tokens
+    ) as server:
+        chatbot = RAGChatbot(
+            documents_dir=args.documents_dir,
+            vector_store_dir=args.vector_store_dir or tmp,
+            embedding_model=args.embedding_model,
+            embedding_cache_dir=None,
+            vector_store_type=args.vector_store_type,
+            answer_cache_size=0,
+            llm_base_url=server.base_url,
+        )
+        chatbot.setup()
+
+        questions = benchmark_questions(args.queries)
+        run = run_async if args.mode == "async" else run_threaded
+        start = time.perf_counter()
+        failures = run(chatbot, questions, args.concurrency)
+        elapsed = time.perf_counter() - start
+
+        succeeded = len(questions) - failures
+        print(f"\n{len(questions)} queries, concurrency {args.concurrency} ({args.mode}), "
+              f"stub latency {args.latency}s, {args.token_rate:g} tokens/s x {args.completion_tokens}")
+        print(f"Wall time: {elapsed:.2f}s  Throughput: {succeeded / elapsed:.1f} queries/s  "
+              f"Failures: {failures}\n")
+        # Failed queries never reach the latency histogram
+        print(chatbot.latency_report())
+
+    if failures:
+        print(f"\n{failures} of {len(questions)} queries failed; see the log above", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Callbacks
+LangChain callback handlers used by the RAG chatbot.
+"""
+
+import queue
+import time
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+import logging
+
+try:
+    from langchain_core.callbacks import BaseCallbackHandler
+except ImportError:
+    BaseCallbackHandler = object
+
+logger = logging.getLogger(__name__)
+
+
+class TokenQueueHandler(BaseCallbackHandler):
+    """
+    Push streamed LLM tokens onto a queue for a consumer on another thread.
+    Only LLMs created with streaming=True emit tokens.
+    """
+
+    def __init__(self, tokens: "queue.Queue"):
+        self.tokens = tokens
+
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        if token:
+            self.tokens.put(token)
+
+
+class StageTimingHandler(BaseCallbackHandler):
+    """
+    Time the retriever and LLM runs inside a chain into a StageTimer.
+    LLMs tagged "condense_question" are timed as the "condense" stage, other
+    LLM calls as "llm". Token usage and retrieved-chunk counts are added to
+    the timer's counts. Only a perf_counter() call per event is added.
+
+    Retrievers wrap other retrievers (packing, multi-query, fusion), and the
+    handler is inherited by all of them, so only the outermost retriever run
+    is timed and counted.
+    """
+
+    def __init__(self, timer):
+        self.timer = timer
+        self._starts: Dict[UUID, float] = {}
+        self._stages: Dict[UUID, str] = {}
+        self._outer_retriever: Optional[UUID] = None
+
+    def _start(self, run_id: UUID, stage: str):
+        self._starts[run_id] = time.perf_counter()
+        self._stages[run_id] = stage
+
+    def _end(self, run_id: UUID):
+        start = self._starts.pop(run_id, None)
+        stage = self._stages.pop(run_id, None)
+        if start is not None:
+            self.timer.add(stage, time.perf_counter() - start)
+
+    def _llm_stage(self, tags) -> str:
+        return "condense" if tags and "condense_question" in tags else "llm"
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, tags=None, **kwargs: Any) -> None:
+        self._start(run_id, self._llm_stage(tags))
+
+    def on_llm_start(self, serialized, prompts: List[str], *, run_id: UUID, tags=None, **kwargs: Any) -> None:
+        self._start(run_id, self._llm_stage(tags))
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt_tokens = usage.get("prompt_tokens")
+        completion_tokens = usage.get("completion_tokens")
+        if prompt_tokens is None:
+            # Streamed responses report usage on the message instead
+            for generations in response.generations:
+                for generation in generations:
+                    metadata = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                    if not metadata:
+                        continue
+                    prompt_tokens = (prompt_tokens or 0) + metadata.get("input_tokens", 0)
+                    completion_tokens = (completion_tokens or 0) + metadata.get("output_tokens", 0)
+        if prompt_tokens is not None:
+            self.timer.count("prompt_tokens", prompt_tokens)
+            self.timer.count("completion_tokens", completion_tokens or 0)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_retriever_start(self, serialized, query: str, *, run_id: UUID, **kwargs: Any) -> None:
+        if self._outer_retriever is None:
+            self._outer_retriever = run_id
+            self._start(run_id, "retrieval")
+
+    def on_retriever_end(self, documents, *, run_id: UUID, **kwargs: Any) -> None:
+        if run_id == self._outer_retriever:
+            self._outer_retriever = None
+            self._end(run_id)
+            self.timer.count("retrieved_chunks", len(documents))
+
+    def on_retriever_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        if run_id == self._outer_retriever:
+            self._outer_retriever = None
+            self._end(run_id)
@@ -0,0 +1,368 @@
+"""
+Text Chunking
+Chunking strategies used by the RAG chatbot to split page text before embedding.
+
+The strategies share one single-pass engine: boundary patterns are compiled once,
+pieces are tracked as (start, end) offsets into the source text, and each chunk
+is assembled with a single join over its pieces. The output is identical to the
+original string-concatenating implementation.
+
+Sizes are measured in characters by default. Passing a TokenCounter measures
+chunk_size and overlap in tiktoken tokens instead, so chunks fit a token budget.
+"""
+
+import re
+from array import array
+from functools import lru_cache
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+try:
+    from langchain.schema import Document
+except ImportError:
+    Document = None
+
+try:
+    import tiktoken
+    HAS_TIKTOKEN = True
+except ImportError:
+    HAS_TIKTOKEN = False
+
+DEFAULT_ENCODING = "cl100k_base"
+
+# Group 1 is the separator. Matching the punctuation instead of using a lookbehind
+# finds the same separators as r'(?<=[.!?])\s+' but lets the regex engine skip
+# ahead to candidate characters: scanning 6.6 MB of prose takes 0.26 s instead of 0.54 s.
+SENTENCE_BOUNDARY = re.compile(r'[.!?](\s+)')
+PARAGRAPH_BOUNDARY = re.compile(r'(\n\n+)')
+
+Span = Tuple[int, int]
+
+
+class ChunkSpan(NamedTuple):
+    """A chunk as a region of one page's text"""
+    page_id: int
+    start: int
+    end: int
+
+
+@lru_cache(maxsize=None)
+def get_encoder(encoding_name: str = DEFAULT_ENCODING):
+    """Load a tiktoken encoding once per process"""
+    if not HAS_TIKTOKEN:
+        raise ImportError("tiktoken not installed. Install with: pip install tiktoken")
+    return tiktoken.get_encoding(encoding_name)
+
+
+class TokenCounter:
+    """Measure text in tokens using a cached tiktoken encoder"""
+
+    def __init__(self, encoding_name: str = DEFAULT_ENCODING):
+        self.encoding_name = encoding_name
+        self.encoder = get_encoder(encoding_name)
+
+    def __getstate__(self):
+        # Encoders are rebuilt from the per-process cache rather than pickled
+        return {'encoding_name': self.encoding_name}
+
+    def __setstate__(self, state):
+        self.__init__(state['encoding_name'])
+
+    def count(self, text: str) -> int:
+        return len(self.encoder.encode_ordinary(text))
+
+    def count_batch(self, texts: List[str]) -> List[int]:
+        """Token counts for many texts with one batched encode call"""
+        if not texts:
+            return []
+        return [len(tokens) for tokens in self.encoder.encode_ordinary_batch(texts)]
+
+    def tail(self, text: str, n_tokens: int) -> str:
+        """The last n_tokens tokens of text"""
+        tokens = self.encoder.encode_ordinary(text)
+        return self.encoder.decode(tokens[-n_tokens:]) if len(tokens) > n_tokens else text
+
+
+def iter_pieces(pattern, text: str, start: int = 0, end: Optional[int] = None) -> Iterator[Span]:
+    """Yield offsets of the pieces pattern.split(text[start:end]) would return"""
+    if end is None:
+        end = len(text)
+    pos = start
+    for match in pattern.finditer(text, start, end):
+        sep_start, sep_end = match.span(1)
+        yield pos, sep_start
+        pos = sep_end
+    yield pos, end
+
+
+def pack_pieces(pieces: List[Span], lengths: List[int], chunk_size: int, sep_len: int) -> Iterator[List[Span]]:
+    """
+    Greedily pack consecutive pieces into chunks, yielding the pieces of each chunk.
+    Mirrors the original rule exactly: a piece joins the current chunk (costing
+    sep_len plus its length) while the chunk is shorter than chunk_size, otherwise
+    it starts a new chunk; empty chunks are dropped.
+    """
+    chunk: List[Span] = []
+    chunk_len = 0
+
+    for piece, length in zip(pieces, lengths):
+        if chunk_len + length < chunk_size:
+            chunk.append(piece)
+            chunk_len += sep_len + length
+        else:
+            if chunk_len:
+                yield chunk
+            chunk = [piece]
+            chunk_len = length
+
+    if chunk_len:
+        yield chunk
+
+
+def pack_text(
+    text: str,
+    strategy: str,
+    chunk_size: int,
+    tokenizer: Optional[TokenCounter] = None,
+) -> Iterator[List[Span]]:
+    """
+    Run a strategy over text, yielding the pieces of each chunk.
+    Unknown strategies fall back to hybrid, as in RAGChatbot.
+    """
+    if strategy == "sentence_aware":
+        groups = [list(iter_pieces(SENTENCE_BOUNDARY, text))]
+    elif strategy == "semantic":
+        groups = [list(iter_pieces(PARAGRAPH_BOUNDARY, text))]
+    else:
+        # Sentences are packed within each paragraph; chunks never span paragraphs
+        groups = [list(iter_pieces(SENTENCE_BOUNDARY, text, start, end))
+                  for start, end in iter_pieces(PARAGRAPH_BOUNDARY, text)]
+    sep = strategy_separator(strategy)
+
+    if tokenizer is None:
+        sep_len = len(sep)
+        for pieces in groups:
+            yield from pack_pieces(pieces, [end - start for start, end in pieces], chunk_size, sep_len)
+        return
+
+    # One batched encode for every piece on the page
+    sep_len = tokenizer.count(sep)
+    lengths = tokenizer.count_batch([text[start:end] for pieces in groups for start, end in pieces])
+    offset = 0
+    for pieces in groups:
+        yield from pack_pieces(pieces, lengths[offset:offset + len(pieces)], chunk_size, sep_len)
+        offset += len(pieces)
+
+
+def strategy_separator(strategy: str) -> str:
+    return "\n\n" if strategy == "semantic" else " "
+
+
+def join_pieces(text: str, pieces: List[Span], sep: str) -> str:
+    """Build the chunk text: pieces joined by sep, edges stripped"""
+    return sep.join([text[start:end] for start, end in pieces]).strip()
+
+
+def overlap_prefix(prev: str, overlap: int, tokenizer: Optional[TokenCounter] = None) -> str:
+    """The end of the previous chunk that is repeated at the start of the next one"""
+    if tokenizer is not None:
+        return tokenizer.tail(prev, overlap)
+    return prev[-overlap:]
+
+
+def add_overlap(chunks: List[str], overlap: int, tokenizer: Optional[TokenCounter] = None) -> List[str]:
+    """Prefix every chunk after the first with the last `overlap` characters (or tokens) of the previous one"""
+    if overlap <= 0 or len(chunks) < 2:
+        return chunks
+
+    overlapped = [chunks[0]]
+    for prev, chunk in zip(chunks, chunks[1:]):
+        overlapped.append(overlap_prefix(prev, overlap, tokenizer) + " " + chunk)
+    return overlapped
+
+
+class Chunker:
+    """Text chunking strategies"""
+
+    @staticmethod
+    def sentence_aware_split(
+        text: str,
+        chunk_size: int = 500,
+        overlap: int = 100,
+        tokenizer: Optional[TokenCounter] = None,
+    ) -> List[str]:
+        """
+        Split text into chunks based on sentence boundaries.
+        Ensures chunks don't break in the middle of sentences.
+        """
+        packed = pack_text(text, "sentence_aware", chunk_size, tokenizer)
+        chunks = [join_pieces(text, pieces, " ") for pieces in packed]
+        return add_overlap(chunks, overlap, tokenizer)
+
+    @staticmethod
+    def semantic_split(
+        text: str,
+        chunk_size: int = 500,
+        tokenizer: Optional[TokenCounter] = None,
+    ) -> List[str]:
+        """
+        Split text based on semantic boundaries (paragraphs, sections).
+        """
+        packed = pack_text(text, "semantic", chunk_size, tokenizer)
+        return [join_pieces(text, pieces, "\n\n") for pieces in packed]
+
+    @staticmethod
+    def hybrid_split(
+        text: str,
+        chunk_size: int = 500,
+        overlap: int = 100,
+        tokenizer: Optional[TokenCounter] = None,
+    ) -> List[str]:
+        """
+        Hybrid strategy combining semantic and sentence-aware splitting.
+        Sentences are packed within each paragraph; chunks never span paragraphs.
+        """
+        packed = pack_text(text, "hybrid", chunk_size, tokenizer)
+        return [join_pieces(text, pieces, " ") for pieces in packed]
+
+    @staticmethod
+    def split_spans(
+        text: str,
+        strategy: str,
+        chunk_size: int = 500,
+        tokenizer: Optional[TokenCounter] = None,
+    ) -> List[Span]:
+        """Chunk boundaries for a strategy as (start, end) offsets into text"""
+        return [(pieces[0][0], pieces[-1][1]) for pieces in pack_text(text, strategy, chunk_size, tokenizer)]
+
+    @staticmethod
+    def span_text(text: str, span: Span, strategy: str) -> str:
+        """Text of one chunk span (without overlap), as the string strategies produce it"""
+        start, end = span
+        pattern = PARAGRAPH_BOUNDARY if strategy == "semantic" else SENTENCE_BOUNDARY
+        return join_pieces(text, list(iter_pieces(pattern, text, start, end)), strategy_separator(strategy))
+
+
+def split_batch(args) -> List[List[Span]]:
+    """Compute chunk spans for a batch of page texts (runs in a worker process)"""
+    texts, strategy, chunk_size, tokenizer = args
+    return [Chunker.split_spans(text, strategy, chunk_size, tokenizer) for text in texts]
+
+
+class ChunkCorpus(Sequence):
+    """
+    Chunks stored as (page_id, start, end) spans over the original page texts.
+
+    Only page texts and three integer arrays are kept; chunk text and metadata
+    are built on access, so the corpus costs roughly the raw text plus a fixed
+    24 bytes per chunk. Indexing returns a Document with the same content and
+    metadata split_documents has always produced.
+    """
+
+    def __init__(
+        self,
+        strategy: str = "hybrid",
+        chunk_size: int = 500,
+        overlap: int = 100,
+        tokenizer: Optional[TokenCounter] = None,
+    ):
+        self.strategy = strategy
+        self.chunk_size = chunk_size
+        self.tokenizer = tokenizer
+        # Only the sentence-aware strategy has ever applied overlap
+        self.overlap = overlap if strategy == "sentence_aware" else 0
+
+        self.pages: List[str] = []
+        self.page_keys: List[Tuple[str, Optional[int]]] = []
+        self.page_first = array('q')
+        self.page_ids = array('q')
+        self.starts = array('q')
+        self.ends = array('q')
+
+    def add_page(
+        self,
+        text: str,
+        source: str = 'unknown',
+        page: Optional[int] = None,
+        spans: Optional[List[Span]] = None,
+    ) -> int:
+        """
+        Record one page and its chunk spans; returns the number of chunks added.
+        Spans are computed here unless they were already computed elsewhere.
+        """
+        page_id = len(self.pages)
+        self.pages.append(text)
+        self.page_keys.append((source, page))
+        self.page_first.append(len(self.page_ids))
+
+        if spans is None:
+            spans = Chunker.split_spans(text, self.strategy, self.chunk_size, self.tokenizer)
+        for start, end in spans:
+            self.page_ids.append(page_id)
+            self.starts.append(start)
+            self.ends.append(end)
+        return len(spans)
+
+    def add_pages(self, pages: List[Tuple[str, str, Optional[int]]], executor=None, workers: int = 1) -> int:
+        """
+        Record many (text, source, page) pages; returns the number of chunks added.
+        With an executor of `workers` processes, pages are partitioned into contiguous
+        batches whose spans are computed in parallel; results come back in order, so page order and
+        chunk numbering are the same as adding the pages one by one.
+        """
+        added = 0
+        if executor is None or len(pages) < 2:
+            for text, source, page in pages:
+                added += self.add_page(text, source, page)
+            return added
+
+        batch_size = max(1, -(-len(pages) // (workers * 4)))
+        batches = [
+            ([text for text, _, _ in pages[i:i + batch_size]], self.strategy, self.chunk_size, self.tokenizer)
+            for i in range(0, len(pages), batch_size)
+        ]
+        span_lists = (spans for batch in executor.map(split_batch, batches) for spans in batch)
+        for (text, source, page), spans in zip(pages, span_lists):
+            added += self.add_page(text, source, page, spans)
+        return added
+
+    def __len__(self) -> int:
+        return len(self.page_ids)
+
+    def span(self, index: int) -> ChunkSpan:
+        return ChunkSpan(self.page_ids[index], self.starts[index], self.ends[index])
+
+    def _page_range(self, page_id: int) -> Tuple[int, int]:
+        first = self.page_first[page_id]
+        last = self.page_first[page_id + 1] if page_id + 1 < len(self.page_first) else len(self.page_ids)
+        return first, last
+
+    def _base_text(self, index: int) -> str:
+        page_id, start, end = self.span(index)
+        return Chunker.span_text(self.pages[page_id], (start, end), self.strategy)
+
+    def text(self, index: int) -> str:
+        """Materialise the text of one chunk, including overlap from the previous chunk on its page"""
+        if index < 0:
+            index += len(self)
+        text = self._base_text(index)
+        if self.overlap > 0 and index > self.page_first[self.page_ids[index]]:
+            text = overlap_prefix(self._base_text(index - 1), self.overlap, self.tokenizer) + " " + text
+        return text
+
+    def metadata(self, index: int) -> Dict:
+        if index < 0:
+            index += len(self)
+        page_id = self.page_ids[index]
+        source, page = self.page_keys[page_id]
+        first, last = self._page_range(page_id)
+        return {
+            'source': source,
+            'page': page,
+            'chunk': index - first,
+            'total_chunks': last - first
+        }
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return Document(page_content=self.text(index), metadata=self.metadata(index))
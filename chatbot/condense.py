@@ -0,0 +1,59 @@
+"""
+Question Condensing
+Decide when a follow-up question has to be rewritten against the chat history.
+
+ConversationalRetrievalChain rewrites every follow-up into a standalone
+question with an extra LLM call. Most follow-ups in practice are already
+self-contained, so the rewrite only runs when the question looks like it
+refers back to the conversation.
+"""
+
+import re
+from typing import Any, Dict, Optional
+import logging
+
+try:
+    from langchain.chains import LLMChain
+    HAS_LANGCHAIN = True
+except ImportError:
+    LLMChain = object
+    HAS_LANGCHAIN = False
+
+logger = logging.getLogger(__name__)
+
+# Pronouns and phrases that point back into the conversation
+_ANAPHORA = re.compile(
+    r"\b(it|its|it's|they|them|their|theirs|this|that|these|those|he|she|him|her|his|hers"
+    r"|former|latter|above|previous|previously|earlier|aforementioned|same|such|one|ones)\b",
+    re.IGNORECASE
+)
+# Elliptical follow-ups: "and in cats?", "what about the dose?" (short ones like
+# "why?" are caught by the word count)
+_CONTINUATION = re.compile(r"^\s*(and|or|but|also|so|what about|how about)\b", re.IGNORECASE)
+_MIN_STANDALONE_WORDS = 4
+
+
+def needs_condensing(question: str) -> bool:
+    """Cheap check for a question that depends on earlier turns"""
+    if len(question.split()) < _MIN_STANDALONE_WORDS:
+        return True
+    return bool(_CONTINUATION.search(question) or _ANAPHORA.search(question))
+
+
+class ConditionalQuestionGenerator(LLMChain):
+    """
+    Condense-question chain that returns the question unchanged, without an
+    LLM call, unless needs_condensing() flags it.
+    """
+
+    def _call(self, inputs: Dict[str, Any], run_manager: Optional[Any] = None) -> Dict[str, str]:
+        question = inputs["question"]
+        if not needs_condensing(question):
+            return {self.output_key: question}
+        return super()._call(inputs, run_manager=run_manager)
+
+    async def _acall(self, inputs: Dict[str, Any], run_manager: Optional[Any] = None) -> Dict[str, str]:
+        question = inputs["question"]
+        if not needs_condensing(question):
+            return {self.output_key: question}
+        return await super()._acall(inputs, run_manager=run_manager)
@@ -0,0 +1,180 @@
+"""
+Context Packing
+Assemble retrieved chunks into the context sent to the LLM.
+
+Neighbouring chunks of a page share chunk_overlap of text, and top-k
+retrieval often returns several of them, so the prompt repeats sentences.
+pack_context merges adjacent and overlapping chunks from the same
+source/page, drops duplicates, and fills a token budget in relevance order.
+tag_sources adds the short source_tag the answer prompt cites chunks by.
+"""
+
+import re
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import logging
+
+from chatbot.chunking import HAS_TIKTOKEN, TokenCounter
+
+try:
+    from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+    from langchain_core.documents import Document
+    from langchain_core.retrievers import BaseRetriever
+except ImportError:
+    AsyncCallbackManagerForRetrieverRun = None
+    CallbackManagerForRetrieverRun = None
+    Document = None
+    BaseRetriever = object
+
+logger = logging.getLogger(__name__)
+
+# Characters of the next chunk's start searched for in the previous chunk's end
+_OVERLAP_PROBE = 64
+_SOURCE_TAG_CHARS = 32
+# Uploaded files are saved as "<YYYYMMDD>_<HHMMSS>_<uploader ID>_<original name>"
+_UPLOAD_PREFIX = re.compile(r'^\d{8}_\d{6}_[A-Z0-9]+_')
+
+
+def source_tag(metadata: Dict) -> str:
+    """
+    Short citation tag for a chunk, e.g. "cbd-in-dogs p3" instead of the full
+    path: the file name without the upload timestamp and uploader prefix,
+    with spaces and underscores as single hyphens.
+    """
+    stem = Path(str(metadata.get('source', 'unknown'))).stem
+    title = re.sub(r'[\s_-]*[\s_][\s_-]*', '-', _UPLOAD_PREFIX.sub('', stem)).strip('-') or stem
+    tag = title[:_SOURCE_TAG_CHARS].rstrip('-')
+    page = metadata.get('page')
+    return f"{tag} p{page}" if page is not None else tag
+
+
+def tag_sources(documents: List[Document]) -> List[Document]:
+    """Copies of documents with metadata['source_tag'] set"""
+    return [
+        Document(page_content=doc.page_content, metadata={**doc.metadata, 'source_tag': source_tag(doc.metadata)})
+        for doc in documents
+    ]
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token) when tiktoken is missing"""
+    return max(1, len(text) // 4)
+
+
+def default_token_counter() -> Callable[[str], int]:
+    return TokenCounter().count if HAS_TIKTOKEN else estimate_tokens
+
+
+def join_overlapping(first: str, second: str) -> str:
+    """Concatenate two consecutive chunks, writing their shared text once"""
+    if second in first:
+        return first
+    probe = second[:_OVERLAP_PROBE]
+    start = first.find(probe, max(0, len(first) - len(second)))
+    while start >= 0:
+        if second.startswith(first[start:]):
+            return first[:start] + second
+        start = first.find(probe, start + 1)
+    return first + " " + second
+
+
+def merge_chunks(documents: List[Document]) -> List[Tuple[Document, int]]:
+    """
+    Merge runs of consecutive chunks of the same source/page into one document
+    and drop duplicate texts. Returns (document, best rank of its chunks);
+    documents keep the metadata of their first chunk plus the merged 'chunks'.
+    """
+    seen = set()
+    groups: Dict[Tuple, List[Tuple[int, Document]]] = {}
+    loose: List[Tuple[Document, int]] = []
+    for rank, doc in enumerate(documents):
+        text = " ".join(doc.page_content.split())
+        if text in seen:
+            continue
+        seen.add(text)
+        metadata = doc.metadata or {}
+        if metadata.get('chunk') is None:
+            loose.append((doc, rank))
+            continue
+        groups.setdefault((metadata.get('source'), metadata.get('page')), []).append((rank, doc))
+
+    merged = list(loose)
+    for members in groups.values():
+        members.sort(key=lambda member: member[1].metadata['chunk'])
+        run: List[Tuple[int, Document]] = []
+        for member in members + [None]:
+            if run and (member is None or member[1].metadata['chunk'] != run[-1][1].metadata['chunk'] + 1):
+                merged.append(_merge_run(run))
+                run = []
+            if member is not None:
+                run.append(member)
+    return merged
+
+
+def _merge_run(run: List[Tuple[int, Document]]) -> Tuple[Document, int]:
+    best_rank = min(rank for rank, _ in run)
+    if len(run) == 1:
+        return run[0][1], best_rank
+    text = run[0][1].page_content
+    for _, doc in run[1:]:
+        text = join_overlapping(text, doc.page_content)
+    metadata = dict(run[0][1].metadata)
+    metadata['chunks'] = [doc.metadata['chunk'] for _, doc in run]
+    return Document(page_content=text, metadata=metadata), best_rank
+
+
+def pack_context(
+    documents: List[Document],
+    max_tokens: int,
+    count_tokens: Optional[Callable[[str], int]] = None
+) -> List[Document]:
+    """
+    Merge, deduplicate and pack documents (in relevance order) into max_tokens.
+    Blocks that do not fit are skipped in favour of smaller, less relevant ones;
+    the most relevant block is truncated rather than dropped.
+    """
+    count_tokens = count_tokens or estimate_tokens
+    blocks = sorted(merge_chunks(documents), key=lambda block: block[1])
+
+    packed, used = [], 0
+    for doc, _ in blocks:
+        tokens = count_tokens(doc.page_content)
+        if used + tokens <= max_tokens:
+            packed.append(doc)
+            used += tokens
+        elif not packed:
+            keep = int(len(doc.page_content) * max_tokens / tokens)
+            packed.append(Document(page_content=doc.page_content[:keep], metadata=doc.metadata))
+            used = max_tokens
+    return packed
+
+
+def assemble_context(
+    documents: List[Document],
+    max_tokens: Optional[int] = None,
+    count_tokens: Optional[Callable[[str], int]] = None
+) -> List[Document]:
+    """Pack documents into max_tokens (if set) and tag them for the answer prompt"""
+    if max_tokens:
+        documents = pack_context(documents, max_tokens, count_tokens)
+    return tag_sources(documents)
+
+
+class PackedContextRetriever(BaseRetriever):
+    """Wrap a retriever so its results go through assemble_context"""
+
+    retriever: Any
+    max_tokens: Optional[int] = 2000
+    count_tokens: Optional[Callable[[str], int]] = None
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        docs = self.retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+        return assemble_context(docs, self.max_tokens, self.count_tokens)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        docs = await self.retriever.ainvoke(query, config={"callbacks": run_manager.get_child()})
+        return assemble_context(docs, self.max_tokens, self.count_tokens)
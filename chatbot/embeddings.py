@@ -0,0 +1,519 @@
+"""
+Embeddings
+Embedding wrappers used by the RAG chatbot's vector store.
+"""
+
+import hashlib
+import math
+import random
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+import logging
+
+try:
+    from langchain_core.embeddings import Embeddings
+except ImportError:
+    Embeddings = object
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+logger = logging.getLogger(__name__)
+
+# SQLite limits the number of bound parameters per statement
+_SQL_BATCH = 500
+
+# EMBEDDING_MODEL values starting with this select the offline HashingEmbeddings,
+# optionally with a dimension suffix, e.g. "local-hashing-512"
+LOCAL_HASHING_PREFIX = "local-hashing"
+
+# Keeps identifiers such as "gc-ms", "mg/kg" and "2.5" as single tokens
+_TOKEN_PATTERN = re.compile(r'[a-z0-9]+(?:[-./][a-z0-9]+)*')
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens, shared by the hashing embeddings and the BM25 index"""
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+# Models whose embed_query is embed_documents([text]), so a batch of queries is one
+# embed_documents request; matched by class name so none of them has to be imported
+_SYMMETRIC_EMBEDDINGS = {'OpenAIEmbeddings', 'AzureOpenAIEmbeddings'}
+
+
+def embeds_queries_as_documents(embeddings) -> bool:
+    return type(embeddings).__name__ in _SYMMETRIC_EMBEDDINGS
+
+
+def embed_queries(
+    embeddings,
+    texts: List[str],
+    max_workers: int = 4,
+    return_exceptions: bool = False,
+) -> List:
+    """
+    Query embeddings for many texts in as few requests as the model allows:
+    the model's own embed_queries, one embed_documents call for models that
+    embed queries and documents alike, otherwise embed_query per text on up
+    to max_workers threads.
+
+    If a batch fails, each text is embedded on its own, so one bad text does
+    not fail the others. With return_exceptions, a text that still fails gets
+    its exception in place of a vector instead of raising.
+    """
+    texts = list(texts)
+    if not texts:
+        return []
+
+    batched = getattr(embeddings, 'embed_queries', None)
+    if batched is None and embeds_queries_as_documents(embeddings):
+        batched = embeddings.embed_documents
+    if batched is not None:
+        try:
+            return batched(texts)
+        except Exception as e:
+            if len(texts) == 1:
+                if return_exceptions:
+                    return [e]
+                raise
+            logger.warning(f"Embedding {len(texts)} queries together failed ({e}); embedding them one at a time")
+
+    def embed_one(text: str):
+        try:
+            return embeddings.embed_query(text)
+        except Exception as e:
+            if not return_exceptions:
+                raise
+            return e
+
+    if len(texts) < 2 or max_workers <= 1:
+        return [embed_one(text) for text in texts]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(texts))) as executor:
+        return list(executor.map(embed_one, texts))
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so formatting-only differences share a cache entry"""
+    return " ".join(text.split())
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Persistent embedding cache in front of another embeddings model.
+
+    Vectors are stored in a local SQLite file keyed by the model name and a hash
+    of the normalised text, so re-indexing after a chunking change only embeds
+    chunks whose text actually changed. When the file grows past max_bytes the
+    least recently used vectors are evicted.
+    """
+
+    def __init__(
+        self,
+        embeddings,
+        cache_path: str = ".embedding_cache/embeddings.sqlite3",
+        model_name: Optional[str] = None,
+        max_bytes: int = 1 << 30,
+    ):
+        self.embeddings = embeddings
+        self.model_name = model_name or getattr(embeddings, 'model', None) or type(embeddings).__name__
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        Path(cache_path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(cache_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY, vector BLOB NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        # Running row count and byte total, kept by triggers so eviction never scans the table
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_size ("
+            " id INTEGER PRIMARY KEY CHECK (id = 0), rows INTEGER NOT NULL, bytes INTEGER NOT NULL)"
+        )
+        if self._conn.execute("SELECT 1 FROM cache_size").fetchone() is None:
+            # Caches created before the totals existed are summed once
+            self._conn.execute(
+                "INSERT INTO cache_size (id, rows, bytes) SELECT 0, COUNT(*), COALESCE(SUM(size), 0) FROM embeddings"
+            )
+        self._conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS embeddings_insert AFTER INSERT ON embeddings BEGIN"
+            " UPDATE cache_size SET rows = rows + 1, bytes = bytes + NEW.size; END"
+        )
+        self._conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS embeddings_delete AFTER DELETE ON embeddings BEGIN"
+            " UPDATE cache_size SET rows = rows - 1, bytes = bytes - OLD.size; END"
+        )
+        self._conn.commit()
+
+    def _key(self, text: str, kind: str) -> str:
+        # Query and document embeddings are kept apart for models that embed them differently
+        payload = f"{self.model_name}\0{kind}\0{normalize_text(text)}".encode('utf-8')
+        return hashlib.sha256(payload).hexdigest()
+
+    def _lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        now = time.time()
+        with self._lock:
+            for i in range(0, len(keys), _SQL_BATCH):
+                batch = keys[i:i + _SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array('f')
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+                self._conn.execute(
+                    f"UPDATE embeddings SET last_used = ? WHERE key IN ({placeholders})", [now, *batch]
+                )
+            self._conn.commit()
+        return found
+
+    def _store(self, items: Dict[str, List[float]]):
+        now = time.time()
+        rows = []
+        for key, vector in items.items():
+            blob = array('f', vector).tobytes()
+            rows.append((key, blob, len(blob), now))
+        with self._lock:
+            # Keys hash the text, so an existing row already holds this vector
+            self._conn.executemany(
+                "INSERT INTO embeddings (key, vector, size, last_used) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT (key) DO UPDATE SET last_used = excluded.last_used", rows
+            )
+            self._conn.commit()
+            self._evict()
+
+    def _evict(self):
+        """Drop least recently used vectors until the cache is back under 90% of max_bytes"""
+        count, total = self._conn.execute("SELECT rows, bytes FROM cache_size").fetchone()
+        if total <= self.max_bytes:
+            return
+
+        target = int(self.max_bytes * 0.9)
+        removed = 0
+        while total > target and count:
+            # Rows needed at the average size; repeated only if the oldest rows are smaller
+            limit = max(1, -(-(total - target) * count // total))
+            removed += self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN"
+                " (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (limit,)
+            ).rowcount
+            count, total = self._conn.execute("SELECT rows, bytes FROM cache_size").fetchone()
+        self._conn.commit()
+        logger.info(f"Evicted {removed} cached embeddings")
+
+    def _embed(self, texts: List[str], kind: str) -> List[List[float]]:
+        keys = [self._key(text, kind) for text in texts]
+        cached = self._lookup(list(dict.fromkeys(keys)))
+
+        # Embed each distinct missing text once
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            if kind == 'query':
+                vectors = embed_queries(self.embeddings, list(missing.values()), return_exceptions=True)
+            else:
+                vectors = self.embeddings.embed_documents(list(missing.values()))
+            fresh = {key: vector for key, vector in zip(missing.keys(), vectors) if not isinstance(vector, Exception)}
+            self._store(fresh)
+            cached.update(fresh)
+            # Vectors that did arrive stay cached, so a per-text retry only re-embeds the failures
+            for vector in vectors:
+                if isinstance(vector, Exception):
+                    raise vector
+
+        return [cached[key] for key in keys]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self._embed(list(texts), 'document')
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text], 'query')[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self._embed(list(texts), 'query')
+
+
+# Connection and timeout errors of the OpenAI client, httpx and requests, matched by
+# class name so none of them has to be imported
+_TRANSIENT_ERROR_NAMES = {
+    'APIConnectionError', 'APITimeoutError', 'InternalServerError',
+    'ConnectError', 'ConnectTimeout', 'ReadTimeout', 'ReadError', 'RemoteProtocolError',
+    'TimeoutException', 'Timeout', 'ConnectionError', 'ChunkedEncodingError',
+}
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    status = getattr(error, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+    return status
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Recognise 429-style errors from the OpenAI client, HTTP libraries or stand-in servers"""
+    return _status_code(error) == 429 or 'RateLimit' in type(error).__name__ or 'rate limit' in str(error).lower()
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """
+    Rate limits, 5xx responses, timeouts and connection failures. Other
+    errors (a bad key, an over-long input) fail the same way on every retry.
+    """
+    if is_rate_limit_error(error):
+        return True
+    status = _status_code(error)
+    if isinstance(status, int):
+        return status >= 500 or status == 408
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    return any(cls.__name__ in _TRANSIENT_ERROR_NAMES for cls in type(error).__mro__)
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after') or headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Thread-safe token bucket: allows tokens_per_minute, refilled continuously"""
+
+    def __init__(self, tokens_per_minute: int):
+        self.capacity = float(tokens_per_minute)
+        self.rate = tokens_per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int):
+        """Block until `tokens` can be spent (requests larger than the bucket wait for a full bucket)"""
+        tokens = min(float(tokens), self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def _estimate_tokens(texts: List[str]) -> List[int]:
+    return [len(text) // 4 + 1 for text in texts]
+
+
+class BatchedEmbeddings(Embeddings):
+    """
+    Embedding scheduler for index builds.
+
+    Documents are grouped into batches of at most max_batch_tokens tokens and
+    max_batch_size texts, and up to max_in_flight batches are embedded at once.
+    An optional token bucket keeps requests under tokens_per_minute. Batches
+    that fail with a transient error (see is_retryable_error) are retried with
+    exponential backoff (honouring Retry-After on 429s) without redoing
+    batches that already succeeded; other errors are raised at once. Wrap a CachedEmbeddings to
+    keep completed batches across runs.
+    """
+
+    def __init__(
+        self,
+        embeddings,
+        max_batch_tokens: int = 8000,
+        max_batch_size: int = 256,
+        max_in_flight: int = 4,
+        tokens_per_minute: Optional[int] = None,
+        max_retries: int = 6,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+        count_tokens: Optional[Callable[[List[str]], List[int]]] = None,
+    ):
+        self.embeddings = embeddings
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.max_in_flight = max(1, max_in_flight)
+        self.bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.count_tokens = count_tokens or _estimate_tokens
+        self.retries = 0
+
+    def plan_batches(self, token_counts: List[int]) -> List[List[int]]:
+        """Group text indices into consecutive batches by token count"""
+        batches = []
+        batch: List[int] = []
+        batch_tokens = 0
+        for index, tokens in enumerate(token_counts):
+            if batch and (batch_tokens + tokens > self.max_batch_tokens or len(batch) >= self.max_batch_size):
+                batches.append(batch)
+                batch, batch_tokens = [], 0
+            batch.append(index)
+            batch_tokens += tokens
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _embed_batch(self, texts: List[str], tokens: int) -> List[List[float]]:
+        attempt = 0
+        while True:
+            if self.bucket:
+                self.bucket.acquire(tokens)
+            try:
+                return self.embeddings.embed_documents(texts)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable_error(e):
+                    raise
+                delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+                if is_rate_limit_error(e):
+                    delay = max(delay, _retry_after(e) or 0.0)
+                delay *= random.uniform(0.8, 1.2)
+                attempt += 1
+                self.retries += 1
+                logger.warning(f"Embedding batch of {len(texts)} failed ({e}); retry {attempt} in {delay:.1f}s")
+                time.sleep(delay)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        texts = list(texts)
+        if not texts:
+            return []
+
+        token_counts = self.count_tokens(texts)
+        batches = self.plan_batches(token_counts)
+        results: List[Optional[List[float]]] = [None] * len(texts)
+
+        def run(indices: List[int]):
+            vectors = self._embed_batch([texts[i] for i in indices], sum(token_counts[i] for i in indices))
+            for i, vector in zip(indices, vectors):
+                results[i] = vector
+
+        if len(batches) == 1 or self.max_in_flight == 1:
+            for indices in batches:
+                run(indices)
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_in_flight, len(batches))) as executor:
+                for future in [executor.submit(run, indices) for indices in batches]:
+                    future.result()
+
+        return results
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        if embeds_queries_as_documents(self.embeddings):
+            # The same request as a document batch, so it gets the same batching, rate limit and retries
+            return self.embed_documents(texts)
+        batched = getattr(self.embeddings, 'embed_queries', None)
+        if batched is not None:
+            # Falling back to one text at a time is left to the outermost embed_queries
+            return batched(texts)
+        return embed_queries(self.embeddings, texts, self.max_in_flight)
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Offline embeddings from feature hashing.
+
+    Word unigrams and bigrams are hashed (CRC32, so vectors are reproducible
+    across processes and machines) into a fixed number of signed buckets,
+    weighted by sublinear term frequency and L2-normalised. No network, no
+    fitting step, and a query embeds in well under a millisecond.
+    """
+
+    def __init__(self, dimensions: int = 1024, use_bigrams: bool = True):
+        if not HAS_NUMPY:
+            raise ImportError("numpy not installed. Install with: pip install numpy")
+        self.dimensions = dimensions
+        self.use_bigrams = use_bigrams
+        self.model = f"{LOCAL_HASHING_PREFIX}-{dimensions}"
+
+    def _features(self, text: str) -> Dict[str, int]:
+        tokens = tokenize(text)
+        counts: Dict[str, int] = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        if self.use_bigrams:
+            for first, second in zip(tokens, tokens[1:]):
+                bigram = f"{first} {second}"
+                counts[bigram] = counts.get(bigram, 0) + 1
+        return counts
+
+    def _vector(self, text: str):
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        counts = self._features(text)
+        if not counts:
+            return vector
+
+        indices = np.empty(len(counts), dtype=np.int64)
+        weights = np.empty(len(counts), dtype=np.float32)
+        for i, (feature, count) in enumerate(counts.items()):
+            h = zlib.crc32(feature.encode('utf-8'))
+            indices[i] = h % self.dimensions
+            # The top hash bit picks the sign, so collisions tend to cancel out
+            weights[i] = (1.0 + math.log(count)) * (1.0 if h & 0x80000000 else -1.0)
+        np.add.at(vector, indices, weights)
+
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._vector(text).tolist() for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._vector(text).tolist()
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_documents(texts)
+
+
+def is_local_model(model_name: Optional[str]) -> bool:
+    return bool(model_name) and model_name.startswith(LOCAL_HASHING_PREFIX)
+
+
+def create_embeddings(model_name: Optional[str] = None):
+    """
+    Build the embedding backend named by EMBEDDING_MODEL.
+    "local-hashing[-<dimensions>]" selects HashingEmbeddings; anything else is an
+    OpenAI embedding model (the library default when no name is given).
+    """
+    if is_local_model(model_name):
+        suffix = model_name[len(LOCAL_HASHING_PREFIX):].lstrip('-')
+        return HashingEmbeddings(dimensions=int(suffix) if suffix else 1024)
+
+    from langchain_openai import OpenAIEmbeddings
+    if model_name:
+        return OpenAIEmbeddings(model=model_name)
+    return OpenAIEmbeddings()
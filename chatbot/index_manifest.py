@@ -0,0 +1,163 @@
+"""
+Index Manifest
+Track which source files are in the vector store, so setup can re-index incrementally.
+"""
+
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "index_manifest.json"
+
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    """Hash a file's content without reading it into memory at once"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_id(source: str, sha256: str, page, chunk: int) -> str:
+    """Stable vector store ID for one chunk of one version of a file"""
+    prefix = hashlib.sha1(f"{source}\0{sha256}".encode('utf-8')).hexdigest()[:16]
+    return f"{prefix}-{page if page is not None else 0}-{chunk}"
+
+
+@dataclass
+class ManifestEntry:
+    """Indexed state of a single source file"""
+    sha256: str
+    params: Dict
+    chunk_ids: List[str] = field(default_factory=list)
+    # File size and mtime when sha256 was taken; None in manifests written before they were recorded
+    size: Optional[int] = None
+    mtime_ns: Optional[int] = None
+
+
+@dataclass
+class ManifestDiff:
+    """Difference between the files on disk and the indexed files"""
+    added: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+
+    @property
+    def to_index(self) -> List[str]:
+        return self.added + self.changed
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.added or self.changed or self.removed)
+
+
+class IndexManifest:
+    """Persisted mapping of source file -> content hash, chunking params and chunk IDs"""
+
+    def __init__(self, index_dir: str):
+        self.path = Path(index_dir) / MANIFEST_FILE
+        self.entries: Dict[str, ManifestEntry] = {}
+        # Index-wide settings (e.g. the embedding model); changing them needs a full rebuild
+        self.settings: Dict = {}
+        # (size, mtime_ns) of the files hashed by file_hashes, recorded by update()
+        self._stats: Dict[str, Tuple[int, int]] = {}
+        # An entry's stat changed without its content; saved with the next save()
+        self.stats_updated = False
+        self.load()
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def load(self):
+        """Load the manifest from disk (missing or unreadable manifests start empty)"""
+        self.entries = {}
+        self.settings = {}
+        if not self.path.exists():
+            return
+
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            for source, entry in data.get('files', {}).items():
+                self.entries[source] = ManifestEntry(**entry)
+            self.settings = data.get('settings', {})
+        except Exception as e:
+            logger.warning(f"Could not read index manifest {self.path}: {e}")
+            self.entries = {}
+
+    def save(self):
+        """Write the manifest atomically so a crash never leaves it half-written"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'settings': self.settings,
+                'files': {k: asdict(v) for k, v in self.entries.items()},
+            }, f, indent=1)
+        os.replace(tmp_path, self.path)
+        self.stats_updated = False
+
+    def file_hashes(self, paths: List[str]) -> Dict[str, str]:
+        """
+        {path: sha256} of the given files. A file whose size and mtime match its
+        manifest entry keeps the recorded hash; only new or touched files are read.
+        """
+        hashes = {}
+        for path in paths:
+            stat = os.stat(path)
+            self._stats[path] = (stat.st_size, stat.st_mtime_ns)
+            entry = self.entries.get(path)
+            if entry is not None and (entry.size, entry.mtime_ns) == self._stats[path]:
+                hashes[path] = entry.sha256
+                continue
+            hashes[path] = file_sha256(path)
+            if entry is not None and entry.sha256 == hashes[path]:
+                # Touched but not changed: remember the new stat so it is not hashed again
+                entry.size, entry.mtime_ns = self._stats[path]
+                self.stats_updated = True
+        return hashes
+
+    def diff(self, current: Dict[str, str], params: Dict) -> ManifestDiff:
+        """Compare {source: sha256} of the files on disk against the manifest"""
+        diff = ManifestDiff()
+        for source, sha in current.items():
+            entry = self.entries.get(source)
+            if entry is None:
+                diff.added.append(source)
+            elif entry.sha256 != sha or entry.params != params:
+                diff.changed.append(source)
+            else:
+                diff.unchanged.append(source)
+        diff.removed = [source for source in self.entries if source not in current]
+        return diff
+
+    def chunk_ids_for(self, sources: List[str]) -> List[str]:
+        ids = []
+        for source in sources:
+            entry = self.entries.get(source)
+            if entry:
+                ids.extend(entry.chunk_ids)
+        return ids
+
+    def all_chunk_ids(self) -> List[str]:
+        return self.chunk_ids_for(list(self.entries))
+
+    def update(self, source: str, sha256: str, params: Dict, chunk_ids: List[str]):
+        size, mtime_ns = self._stats.get(source, (None, None))
+        self.entries[source] = ManifestEntry(
+            sha256=sha256, params=dict(params), chunk_ids=list(chunk_ids), size=size, mtime_ns=mtime_ns
+        )
+
+    def remove(self, source: str):
+        self.entries.pop(source, None)
+
+    def clear(self):
+        self.entries = {}
@@ -24,6 +24,8 @@ class KnowledgeGraphIntegration:
         self.graph = None
         self.doc_topics = defaultdict(list)
         self.entity_docs = defaultdict(set)
+        # expand_query results by query; the graph only changes in load_graph
+        self._expansions = {}
         if graph_path is None:
             graph_path = Path(__file__).parent.parent / "knowledge_graph.json"
         self.load_graph(graph_path)
@@ -63,6 +65,7 @@ class KnowledgeGraphIntegration:
                     self.graph.add_edge(src, tgt, **attrs)
 
             # Build lookup indices (works with either format)
+            self._expansions.clear()
             self.doc_topics.clear()
             self.entity_docs.clear()
             edge_iter = data.get('edges') or data.get('links') or []
@@ -93,7 +96,11 @@ class KnowledgeGraphIntegration:
         return related
 
     def expand_query(self, query: str) -> List[str]:
-        """Expand query with related topics from the graph"""
+        """Expand query with related topics from the graph (memoised per query)"""
+        cached = self._expansions.get(query)
+        if cached is not None:
+            return list(cached)
+
         expanded = [query]
 
         # Extract potential entities from query
@@ -107,4 +114,8 @@ class KnowledgeGraphIntegration:
                     if node_label and word in node_label and node_label not in query:
                         expanded.append(node_label)
 
-        return expanded[:5]  # Limit to 5 expanded terms
\ No newline at end of file
+        expanded = expanded[:5]  # Limit to 5 expanded terms
+        if len(self._expansions) >= 4096:
+            self._expansions.clear()
+        self._expansions[query] = tuple(expanded)
+        return expanded
\ No newline at end of file
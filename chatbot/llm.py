@@ -0,0 +1,64 @@
+"""
+LLM Backends
+Build the chat model used by the RAG chatbot from configuration.
+
+Any server that speaks the OpenAI chat-completions protocol can be used by
+setting a base URL: OpenAI itself (the default), a local Ollama or vLLM
+server, or the bundled stand-in (python -m chatbot.stub_server) for load
+tests without network access or API spend.
+"""
+
+import os
+from typing import Any, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LLM_MODEL = "gpt-3.5-turbo"
+DEFAULT_TEMPERATURE = 0.7
+
+
+def llm_settings(
+    model_name: Optional[str] = None,
+    temperature: Optional[float] = None,
+    base_url: Optional[str] = None,
+    max_tokens: Optional[int] = None,
+) -> dict:
+    """
+    Resolve LLM settings: explicit arguments first, then LLM_MODEL,
+    LLM_TEMPERATURE, LLM_BASE_URL and LLM_MAX_TOKENS, then defaults.
+    """
+    if temperature is None and os.getenv("LLM_TEMPERATURE"):
+        temperature = float(os.getenv("LLM_TEMPERATURE"))
+    if max_tokens is None and os.getenv("LLM_MAX_TOKENS"):
+        max_tokens = int(os.getenv("LLM_MAX_TOKENS"))
+    return {
+        'model_name': model_name or os.getenv("LLM_MODEL") or DEFAULT_LLM_MODEL,
+        'temperature': DEFAULT_TEMPERATURE if temperature is None else temperature,
+        'base_url': base_url or os.getenv("LLM_BASE_URL") or None,
+        'max_tokens': max_tokens,
+    }
+
+
+def create_chat_model(
+    model_name: str,
+    temperature: float,
+    base_url: Optional[str] = None,
+    max_tokens: Optional[int] = None,
+    **kwargs: Any
+):
+    """
+    Chat model for an OpenAI-compatible endpoint.
+    With a base_url and no OPENAI_API_KEY a placeholder key is sent, since
+    local servers usually do not check it.
+    """
+    from langchain_openai import ChatOpenAI
+
+    params = dict(model_name=model_name, temperature=temperature, **kwargs)
+    if max_tokens:
+        params['max_tokens'] = max_tokens
+    if base_url:
+        params['base_url'] = base_url
+        params['api_key'] = os.getenv("LLM_API_KEY") or os.getenv("OPENAI_API_KEY") or "not-needed"
+        logger.info(f"Using LLM {model_name} at {base_url}")
+    return ChatOpenAI(**params)
@@ -0,0 +1,93 @@
+"""
+Conversation Memory
+Chat history bounded to a token budget.
+
+LangChain's token-buffer memories count tokens through the LLM, which for
+OpenAI models needs tiktoken's downloaded encoding, so offline every turn
+failed after the answer had been generated. These variants count with a
+supplied function instead (RAGChatbot.count_tokens falls back to an
+estimate), and a failure while pruning is logged rather than raised.
+"""
+
+from typing import Any, Callable, Dict, List
+import logging
+
+from chatbot.context import estimate_tokens
+
+try:
+    from langchain.memory import ConversationSummaryBufferMemory, ConversationTokenBufferMemory
+    from langchain.memory.chat_memory import BaseChatMemory
+    HAS_LANGCHAIN = True
+except ImportError:
+    ConversationSummaryBufferMemory = object
+    ConversationTokenBufferMemory = object
+    BaseChatMemory = None
+    HAS_LANGCHAIN = False
+
+logger = logging.getLogger(__name__)
+
+# Per-message formatting tokens (role and separators) in a chat prompt
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def count_message_tokens(messages: List[Any], count_tokens: Callable[[str], int]) -> int:
+    """Tokens a list of chat messages adds to a prompt"""
+    return sum(count_tokens(str(message.content)) + MESSAGE_OVERHEAD_TOKENS for message in messages)
+
+
+def drop_oldest(memory, count_tokens: Callable[[str], int]) -> List[Any]:
+    """Pop the oldest messages until memory fits max_token_limit; returns them"""
+    buffer = memory.chat_memory.messages
+    sizes = [count_message_tokens([message], count_tokens) for message in buffer]
+    total = sum(sizes)
+    pruned = []
+    while buffer and total > memory.max_token_limit:
+        pruned.append(buffer.pop(0))
+        total -= sizes.pop(0)
+    return pruned
+
+
+class TokenBudgetMemory(ConversationTokenBufferMemory):
+    """Most recent turns within max_token_limit tokens, as counted by count_tokens"""
+
+    count_tokens: Callable[[str], int] = estimate_tokens
+
+    def _prune(self):
+        try:
+            drop_oldest(self, self.count_tokens)
+        except Exception as e:
+            logger.warning(f"Could not prune conversation memory: {e}")
+
+    def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        # Skip ConversationTokenBufferMemory's LLM-based pruning
+        BaseChatMemory.save_context(self, inputs, outputs)
+        self._prune()
+
+    async def asave_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        await BaseChatMemory.asave_context(self, inputs, outputs)
+        self._prune()
+
+
+class SummaryTokenBudgetMemory(ConversationSummaryBufferMemory):
+    """
+    Like TokenBudgetMemory, but turns pushed out of the budget are folded into
+    a rolling summary by the LLM. If summarising fails they are just dropped.
+    """
+
+    count_tokens: Callable[[str], int] = estimate_tokens
+
+    def prune(self) -> None:
+        try:
+            pruned = drop_oldest(self, self.count_tokens)
+            if pruned:
+                self.moving_summary_buffer = self.predict_new_summary(pruned, self.moving_summary_buffer)
+        except Exception as e:
+            logger.warning(f"Could not summarise pruned conversation turns: {e}")
+
+    async def aprune(self) -> None:
+        try:
+            pruned = drop_oldest(self, self.count_tokens)
+            if pruned:
+                self.moving_summary_buffer = await self.apredict_new_summary(pruned, self.moving_summary_buffer)
+        except Exception as e:
+            logger.warning(f"Could not summarise pruned conversation turns: {e}")
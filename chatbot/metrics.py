@@ -0,0 +1,124 @@
+"""
+Metrics
+Per-query stage timings and an in-process latency histogram.
+"""
+
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Histogram buckets grow geometrically from 10 microseconds: about 10% relative
+# error on percentiles, with ~170 buckets covering up to ten minutes
+_BUCKET_BASE_MS = 0.01
+_BUCKET_GROWTH = 1.1
+_BUCKET_COUNT = 190
+
+
+def _bucket(ms: float) -> int:
+    if ms <= _BUCKET_BASE_MS:
+        return 0
+    return min(_BUCKET_COUNT - 1, int(math.log(ms / _BUCKET_BASE_MS, _BUCKET_GROWTH)) + 1)
+
+
+def _bucket_upper_ms(index: int) -> float:
+    return _BUCKET_BASE_MS * _BUCKET_GROWTH ** index
+
+
+class StageTimer:
+    """Wall-clock time per stage of one query, in milliseconds"""
+
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self.started = time.perf_counter()
+
+    def add(self, stage: str, seconds: float):
+        self.timings[stage] = self.timings.get(stage, 0.0) + seconds * 1000.0
+
+    def count(self, name: str, value: int):
+        self.counts[name] = self.counts.get(name, 0) + value
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def finish(self) -> Dict:
+        """Close the 'total' stage and return everything as response metadata"""
+        self.timings['total'] = (time.perf_counter() - self.started) * 1000.0
+        return {
+            'timings_ms': {stage: round(ms, 3) for stage, ms in self.timings.items()},
+            **self.counts,
+        }
+
+
+class LatencyHistogram:
+    """Thread-safe log-bucketed latency histograms, one per stage"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self._buckets: Dict[str, List[int]] = {}
+        self._totals: Dict[str, float] = {}
+        self._max: Dict[str, float] = {}
+
+    def record(self, timings_ms: Dict[str, float]):
+        with self._lock:
+            for stage, ms in timings_ms.items():
+                buckets = self._buckets.get(stage)
+                if buckets is None:
+                    buckets = self._buckets[stage] = [0] * _BUCKET_COUNT
+                buckets[_bucket(ms)] += 1
+                self._totals[stage] = self._totals.get(stage, 0.0) + ms
+                self._max[stage] = max(self._max.get(stage, 0.0), ms)
+
+    def percentile(self, stage: str, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-th percentile (0-100)"""
+        buckets = self._buckets.get(stage)
+        if not buckets:
+            return None
+        rank = max(1, math.ceil(sum(buckets) * q / 100.0))
+        seen = 0
+        for index, count in enumerate(buckets):
+            seen += count
+            if seen >= rank:
+                return min(_bucket_upper_ms(index), self._max[stage])
+        return self._max[stage]
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            result = {}
+            for stage, buckets in self._buckets.items():
+                count = sum(buckets)
+                result[stage] = {
+                    'count': count,
+                    'mean_ms': self._totals[stage] / count,
+                    'p50_ms': self.percentile(stage, 50),
+                    'p95_ms': self.percentile(stage, 95),
+                    'p99_ms': self.percentile(stage, 99),
+                    'max_ms': self._max[stage],
+                }
+            return result
+
+    def dump(self) -> str:
+        """Table of per-stage latency percentiles"""
+        summary = self.summary()
+        if not summary:
+            return "No queries recorded"
+        lines = [f"{'stage':<18}{'count':>7}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}  (ms)"]
+        for stage, row in sorted(summary.items(), key=lambda item: -item[1]['mean_ms']):
+            lines.append(
+                f"{stage:<18}{row['count']:>7}{row['mean_ms']:>10.1f}{row['p50_ms']:>10.1f}"
+                f"{row['p95_ms']:>10.1f}{row['p99_ms']:>10.1f}{row['max_ms']:>10.1f}"
+            )
+        return "\n".join(lines)
@@ -14,16 +14,35 @@ Features:
   - Caching and performance optimization
 """
 
+import asyncio
 import os
+import queue
 import sys
-import re
+import threading
+import time
 import warnings
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Tuple, Iterable, Iterator, Sequence
 from dataclasses import dataclass
 from datetime import datetime
 import logging
 from chatbot.knowledge_graph import KnowledgeGraphIntegration
+from chatbot.index_manifest import IndexManifest, chunk_id
+from chatbot.text_cache import PageTextCache
+from chatbot.chunking import Chunker, ChunkCorpus, TokenCounter, split_batch
+from chatbot.embeddings import CachedEmbeddings, BatchedEmbeddings, create_embeddings, embed_queries, is_local_model
+from chatbot.vector_index import LocalVectorStore, NumpyVectorStore, FaissHNSWVectorStore
+from chatbot.retrieval import BM25Index, FusedRetriever, ExpandedQueryRetriever
+from chatbot.callbacks import TokenQueueHandler, StageTimingHandler
+from chatbot.metrics import StageTimer, LatencyHistogram
+from chatbot.answer_cache import AnswerCache
+from chatbot.condense import ConditionalQuestionGenerator, needs_condensing
+from chatbot.context import PackedContextRetriever, assemble_context, default_token_counter, estimate_tokens
+from chatbot.llm import llm_settings, create_chat_model
+from chatbot.memory import TokenBudgetMemory, SummaryTokenBudgetMemory, count_message_tokens
 
 # Suppress warnings
 warnings.filterwarnings('ignore', message='.*urllib3 v2 only supports OpenSSL.*')
@@ -46,16 +65,11 @@ try:
         RecursiveCharacterTextSplitter,
         CharacterTextSplitter,
     )
-    from langchain_community.document_loaders import (
-        PyPDFLoader,
-        DirectoryLoader,
-        TextLoader
-    )
+    from langchain_community.document_loaders import TextLoader
     from langchain.schema import Document
     from langchain_chroma import Chroma
-    from langchain_openai import OpenAIEmbeddings, ChatOpenAI
     from langchain.chains import RetrievalQA, ConversationalRetrievalChain
-    from langchain.prompts import PromptTemplate
+    from langchain.prompts import PromptTemplate, ChatPromptTemplate
     from langchain.memory import ConversationBufferMemory
     import networkx as nx
     HAS_LANGCHAIN = True
@@ -65,6 +79,35 @@ except ImportError as e:
     HAS_LANGCHAIN = False
 
 
+# Pages per chunking task when split_workers > 1; tasks span file boundaries
+SPLIT_BATCH_PAGES = 8
+
+# Kept byte-identical across requests and placed first in the prompt, so
+# provider-side prompt prefix caching can reuse it
+SYSTEM_PROMPT = """You are an expert assistant helping users understand technical documents.
+
+IMPORTANT INSTRUCTIONS:
+1. Always base your answers on the provided document excerpts
+2. If information is not in the documents, clearly state that
+3. Provide specific examples from the documents when possible
+4. Maintain technical accuracy
+5. Be concise but comprehensive
+
+When providing an answer:
+- Start with a direct answer to the question
+- Support it with relevant excerpts from the documents
+- Explain the significance and context
+- Suggest related questions the user might find helpful
+
+Each excerpt is preceded by its source tag in square brackets, e.g. [report p3].
+
+Format your response clearly with:
+- **Answer**: Your main response
+- **Key Points**: Bulleted key information
+- **Sources**: Source tags of the excerpts you used
+- **Related Topics**: Other topics mentioned in the documents"""
+
+
 @dataclass
 class SourceInfo:
     """Information about a document source"""
@@ -86,93 +129,47 @@ class ChatResponse:
     metadata: Dict = None
 
 
-class Chunker:
-    """Text chunking strategies"""
-
-    @staticmethod
-    def sentence_aware_split(text: str, chunk_size: int = 500, overlap: int = 100) -> List[str]:
-        """
-        Split text into chunks based on sentence boundaries.
-        Ensures chunks don't break in the middle of sentences.
-        """
-        sentences = re.split(r'(?<=[.!?])\s+', text)
-        chunks = []
-        current_chunk = ""
-
-        for sentence in sentences:
-            if len(current_chunk) + len(sentence) < chunk_size:
-                current_chunk += " " + sentence
-            else:
-                if current_chunk:
-                    chunks.append(current_chunk.strip())
-                current_chunk = sentence
-
-        if current_chunk:
-            chunks.append(current_chunk.strip())
-
-        # Add overlap
-        if overlap > 0:
-            overlapped_chunks = []
-            for i, chunk in enumerate(chunks):
-                if i > 0:
-                    # Add end of previous chunk
-                    prev_chunk_end = chunks[i-1][-overlap:] if len(chunks[i-1]) > overlap else chunks[i-1]
-                    overlapped_chunks.append(prev_chunk_end + " " + chunk)
-                else:
-                    overlapped_chunks.append(chunk)
-            chunks = overlapped_chunks
-
-        return chunks
-
-    @staticmethod
-    def semantic_split(text: str, chunk_size: int = 500) -> List[str]:
-        """
-        Split text based on semantic boundaries (paragraphs, sections).
-        """
-        # Split by major sections (headers)
-        sections = re.split(r'\n\n+', text)
-        chunks = []
-        current_chunk = ""
-
-        for section in sections:
-            if len(current_chunk) + len(section) < chunk_size:
-                current_chunk += "\n\n" + section
-            else:
-                if current_chunk:
-                    chunks.append(current_chunk.strip())
-                current_chunk = section
-
-        if current_chunk:
-            chunks.append(current_chunk.strip())
+@dataclass
+class StreamEvent:
+    """One event from query_stream: an answer token, or the final response"""
+    type: str  # "token" or "done"
+    token: str = ""
+    response: Optional[ChatResponse] = None
+
+
+def _load_pdf_file(
+    path: str,
+    sha256: Optional[str] = None,
+    cache_dir: Optional[str] = None,
+) -> Tuple[str, List[Document], float, Optional[str]]:
+    """
+    Parse a single PDF into per-page documents, reading through the page text cache.
+    Runs inside a worker process, so errors are returned instead of raised.
+    """
+    start = time.perf_counter()
+    try:
+        texts = PageTextCache(cache_dir).get_pages(path, sha256)
+        pages = [
+            Document(page_content=text, metadata={'source': path, 'page': page})
+            for page, text in enumerate(texts)
+        ]
+        return path, pages, time.perf_counter() - start, None
+    except Exception as e:
+        return path, [], time.perf_counter() - start, str(e)
 
-        return chunks
 
-    @staticmethod
-    def hybrid_split(text: str, chunk_size: int = 500, overlap: int = 100) -> List[str]:
-        """
-        Hybrid strategy combining semantic and sentence-aware splitting.
-        """
-        # First split by paragraphs
-        sections = re.split(r'\n\n+', text)
-        chunks = []
-
-        for section in sections:
-            # Then split by sentences within each section
-            sentences = re.split(r'(?<=[.!?])\s+', section)
-            current_chunk = ""
+@dataclass
+class _PendingFile:
+    """A file whose pages are being chunked, with the number still in flight"""
+    source: str
+    corpus: ChunkCorpus
+    remaining: int
 
-            for sentence in sentences:
-                if len(current_chunk) + len(sentence) < chunk_size:
-                    current_chunk += " " + sentence
-                else:
-                    if current_chunk:
-                        chunks.append(current_chunk.strip())
-                    current_chunk = sentence
 
-            if current_chunk:
-                chunks.append(current_chunk.strip())
+def _format_chat_history(chat_history: Sequence[Tuple[str, str]]) -> str:
+    """Render (question, answer) pairs the way ConversationalRetrievalChain does"""
+    return "\n".join(f"Human: {human}\nAssistant: {ai}" for human, ai in chat_history)
 
-        return chunks
 
 class RAGChatbot:
     """RAG Chatbot with advanced features"""
@@ -181,135 +178,444 @@ class RAGChatbot:
         self,
         documents_dir: str = "../pdfs",
         vector_store_dir: str = ".chroma_db",
-        model_name: str = "gpt-3.5-turbo",
-        temperature: float = 0.7,
+        model_name: Optional[str] = None,
+        temperature: Optional[float] = None,
         chunking_strategy: str = "hybrid",
         chunk_size: int = 500,
         chunk_overlap: int = 100,
+        chunk_unit: str = "chars",
+        load_workers: int = 1,
+        split_workers: int = 1,
+        page_cache_dir: Optional[str] = None,
+        embed_batch_size: int = 256,
+        embedding_cache_dir: Optional[str] = ".embedding_cache",
+        embedding_cache_mb: int = 1024,
+        embed_concurrency: int = 4,
+        embed_tokens_per_minute: Optional[int] = None,
+        embedding_model: Optional[str] = None,
+        vector_store_type: Optional[str] = None,
+        hnsw_m: int = 32,
+        hnsw_ef_search: int = 64,
+        hybrid_search: bool = True,
+        answer_cache_size: int = 256,
+        answer_cache_ttl: Optional[float] = 3600,
+        answer_cache_similarity: Optional[float] = None,
+        multi_query: bool = False,
+        max_query_variants: int = 3,
+        memory_token_limit: int = 2000,
+        summarize_memory: bool = False,
+        condense_mode: str = "auto",
+        context_token_budget: Optional[int] = 2000,
+        llm_base_url: Optional[str] = None,
     ):
         """Initialize the enhanced RAG chatbot"""
         load_dotenv()
 
         self.documents_dir = Path(documents_dir)
         self.vector_store_dir = vector_store_dir
-        self.model_name = model_name
-        self.temperature = temperature
+        # None falls back to LLM_MODEL / LLM_TEMPERATURE / LLM_BASE_URL / LLM_MAX_TOKENS
+        settings = llm_settings(model_name, temperature, llm_base_url)
+        self.model_name = settings['model_name']
+        self.temperature = settings['temperature']
+        self.llm_base_url = settings['base_url']
+        self.llm_max_tokens = settings['max_tokens']
         self.chunking_strategy = chunking_strategy
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
+        # "tokens" measures chunk_size/chunk_overlap in tiktoken tokens instead of characters
+        self.chunk_unit = chunk_unit
+        self.tokenizer = TokenCounter() if chunk_unit == "tokens" else None
+        self.load_workers = max(1, load_workers)
+        self.split_workers = max(1, split_workers)
+        self.page_cache_dir = page_cache_dir
+        self.embed_batch_size = max(1, embed_batch_size)
+        self.embedding_cache_dir = embedding_cache_dir
+        self.embedding_cache_mb = embedding_cache_mb
+        self.embed_concurrency = embed_concurrency
+        self.embed_tokens_per_minute = embed_tokens_per_minute
+        # None uses EMBEDDING_MODEL from the environment, then the OpenAI default
+        self.embedding_model = embedding_model or os.getenv("EMBEDDING_MODEL") or None
+        # "chroma", "numpy" (in-process brute force over a memory-mapped matrix)
+        # or "faiss"/"hnsw" (approximate search over the same matrix)
+        self.vector_store_type = (vector_store_type or os.getenv("VECTOR_STORE_TYPE") or "chroma").lower()
+        if self.vector_store_type == "hnsw":
+            self.vector_store_type = "faiss"
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef_search = hnsw_ef_search
+        # Fuse BM25 keyword search with the dense retriever (exact terms like "GC-MS")
+        self.hybrid_search = hybrid_search
+        # Also retrieve for knowledge-graph expansions of the question and fuse the results
+        self.multi_query = multi_query
+        self.max_query_variants = max_query_variants
+        # Conversation history kept for the condense step, in tokens; older turns
+        # are dropped, or folded into a rolling summary with summarize_memory
+        self.memory_token_limit = memory_token_limit
+        self.summarize_memory = summarize_memory
+        # "auto" only rewrites follow-ups that refer back to the conversation
+        # ("it", "those dogs", "what about..."); "always" rewrites every follow-up
+        self.condense_mode = condense_mode
+        # Retrieved chunks are merged, deduplicated and packed into this many
+        # tokens before reaching the LLM (None passes them through unchanged)
+        self.context_token_budget = context_token_budget
+        self._token_counter = None
 
         self.documents = []
+        self.load_stats: Dict[str, float] = {}
+        self.embeddings = None
         self.vector_store = None
+        self.lexical_index: Optional[BM25Index] = None
+        self.manifest: Optional[IndexManifest] = None
         self.qa_chain = None
         self.memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True)
         self.kg_integration = KnowledgeGraphIntegration()
         self.chunker = Chunker()
+        # Per-stage query latencies, aggregated across queries (see latency_report)
+        self.latency = LatencyHistogram()
+        # Answers to standalone questions, cleared whenever the index changes.
+        # answer_cache_similarity also matches near-duplicate questions by
+        # embedding; calibrate it per embedding model (off by default)
+        self.answer_cache = AnswerCache(
+            max_entries=answer_cache_size,
+            ttl_seconds=answer_cache_ttl,
+            similarity_threshold=answer_cache_similarity
+        ) if answer_cache_size > 0 else None
 
         logger.info(f"Initialized chatbot with {chunking_strategy} chunking strategy")
 
-    def load_documents(self) -> List[Document]:
-        """Load all documents from the documents directory"""
+    def source_files(self) -> Dict[str, List[str]]:
+        """List the PDF and text files under the documents directory in sorted order"""
+        return {
+            'pdf': sorted(str(p) for p in self.documents_dir.glob("**/*.pdf")),
+            'txt': sorted(str(p) for p in self.documents_dir.glob("**/*.txt")),
+        }
+
+    def load_documents(
+        self,
+        paths: Optional[List[str]] = None,
+        hashes: Optional[Dict[str, str]] = None,
+    ) -> List[Document]:
+        """
+        Load documents from the documents directory.
+        If paths is given only those files are loaded; known content hashes
+        can be passed in to avoid re-hashing files for the page text cache.
+        """
+        documents = [page for _, pages in self.iter_files(paths, hashes) for page in pages]
+        self.documents = documents
+        return documents
+
+    def iter_files(
+        self,
+        paths: Optional[List[str]] = None,
+        hashes: Optional[Dict[str, str]] = None,
+    ) -> Iterator[Tuple[str, List[Document]]]:
+        """
+        Stream (path, pages) for each document file, one file at a time.
+        Files that fail to load are logged and skipped.
+        """
         logger.info(f"Loading documents from {self.documents_dir}")
 
         if not self.documents_dir.exists():
             logger.error(f"Documents directory not found: {self.documents_dir}")
-            return []
+            return
 
-        documents = []
+        files = self.source_files()
+        if paths is not None:
+            wanted = set(paths)
+            files = {kind: [p for p in found if p in wanted] for kind, found in files.items()}
 
         # Load PDFs
-        pdf_loader = DirectoryLoader(
-            str(self.documents_dir),
-            glob="**/*.pdf",
-            loader_cls=PyPDFLoader,
-            show_progress=True
-        )
-
-        try:
-            pdf_docs = pdf_loader.load()
-            documents.extend(pdf_docs)
-            logger.info(f"Loaded {len(pdf_docs)} PDF documents")
-        except Exception as e:
-            logger.warning(f"Error loading PDFs: {e}")
+        pdf_pages = 0
+        for path, pages in self.iter_pdfs(files['pdf'], hashes):
+            pdf_pages += len(pages)
+            yield path, pages
+        logger.info(f"Loaded {pdf_pages} PDF documents")
 
         # Load text files
-        text_loader = DirectoryLoader(
-            str(self.documents_dir),
-            glob="**/*.txt",
-            loader_cls=TextLoader
-        )
+        text_pages = 0
+        for path in files['txt']:
+            try:
+                pages = TextLoader(path).load()
+            except Exception as e:
+                logger.warning(f"Error loading text file {path}: {e}")
+                continue
+            text_pages += len(pages)
+            yield path, pages
+        logger.info(f"Loaded {text_pages} text documents")
 
-        try:
-            text_docs = text_loader.load()
-            documents.extend(text_docs)
-            logger.info(f"Loaded {len(text_docs)} text documents")
-        except Exception as e:
-            logger.warning(f"Error loading text files: {e}")
+    def load_pdfs(self, pdf_paths: List[str], hashes: Optional[Dict[str, str]] = None) -> List[Document]:
+        """Parse the given PDFs into per-page documents"""
+        return [page for _, pages in self.iter_pdfs(pdf_paths, hashes) for page in pages]
 
-        self.documents = documents
-        return documents
+    def iter_pdfs(
+        self,
+        pdf_paths: List[str],
+        hashes: Optional[Dict[str, str]] = None,
+    ) -> Iterator[Tuple[str, List[Document]]]:
+        """
+        Parse the given PDFs into per-page documents, one file per task.
+        Page text comes from the shared page text cache when available.
+        With load_workers > 1 files are parsed in a process pool with a bounded
+        number of files in flight. Files are yielded in input order regardless
+        of completion order, and a file that fails to parse is logged and skipped.
+        """
+        if not pdf_paths:
+            return
+
+        hashes = hashes or {}
+        tasks = [(path, hashes.get(path), self.page_cache_dir) for path in pdf_paths]
+
+        self.load_stats = {}
+        if self.load_workers > 1 and len(pdf_paths) > 1:
+            workers = min(self.load_workers, len(pdf_paths))
+            logger.info(f"Parsing {len(pdf_paths)} PDFs with {workers} workers")
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                in_flight = deque()
+                for task in tasks:
+                    in_flight.append(executor.submit(_load_pdf_file, *task))
+                    if len(in_flight) >= 2 * workers:
+                        yield from self._collect_pdf(in_flight.popleft().result())
+                while in_flight:
+                    yield from self._collect_pdf(in_flight.popleft().result())
+        else:
+            for task in tasks:
+                yield from self._collect_pdf(_load_pdf_file(*task))
+
+        slowest = sorted(self.load_stats.items(), key=lambda item: item[1], reverse=True)[:5]
+        logger.info(f"Parsed PDFs in {sum(self.load_stats.values()):.2f}s total; slowest files:")
+        for path, elapsed in slowest:
+            logger.info(f"  {elapsed:6.2f}s  {Path(path).name}")
+
+    def _collect_pdf(self, result) -> Iterator[Tuple[str, List[Document]]]:
+        """Record the parse time of one PDF and pass its pages on if it loaded"""
+        path, pages, elapsed, error = result
+        self.load_stats[path] = elapsed
+        if error:
+            logger.warning(f"Error loading PDF {path}: {error}")
+            return
+        logger.debug(f"Parsed {path}: {len(pages)} pages in {elapsed:.2f}s")
+        yield path, pages
 
-    def split_documents(self, documents: List[Document]) -> List[Document]:
+    def split_documents(self, documents: Iterable[Document]) -> ChunkCorpus:
         """
-        Split documents into chunks using the configured strategy
+        Split documents into chunks using the configured strategy.
+        The result is a ChunkCorpus: a sequence of chunk Documents stored as
+        spans over the page texts and only materialised when accessed.
         """
         logger.info(f"Splitting documents using {self.chunking_strategy} strategy")
 
-        split_docs = []
+        with self._split_executor() as executor:
+            corpus = self._chunk_pages(documents, executor)
+
+        logger.info(f"Created {len(corpus)} document chunks")
+        return corpus
+
+    def _chunk_pages(self, documents: Iterable[Document], executor=None) -> ChunkCorpus:
+        corpus = ChunkCorpus(self.chunking_strategy, self.chunk_size, self.chunk_overlap, self.tokenizer)
+        corpus.add_pages(
+            [
+                (doc.page_content, doc.metadata.get('source', 'unknown'), doc.metadata.get('page', None))
+                for doc in documents
+            ],
+            executor=executor,
+            workers=self.split_workers
+        )
+        return corpus
 
-        for doc in documents:
-            text = doc.page_content
-            source = doc.metadata.get('source', 'unknown')
-            page = doc.metadata.get('page', None)
+    def _iter_chunked_files(
+        self,
+        paths: List[str],
+        hashes: Dict[str, str],
+        executor=None
+    ) -> Iterator[Tuple[str, ChunkCorpus]]:
+        """
+        Stream (path, chunks) for each file, in file order.
+        With an executor, pages are cut into batches of SPLIT_BATCH_PAGES that
+        span file boundaries, and up to two batches per worker are chunked
+        while earlier results are consumed in order, so short files and
+        single-page text files keep every worker busy.
+        """
+        if executor is None:
+            for source, pages in self.iter_files(paths, hashes):
+                yield source, self._chunk_pages(pages)
+            return
 
-            # Choose chunking strategy
-            if self.chunking_strategy == "sentence_aware":
-                chunks = self.chunker.sentence_aware_split(
-                    text,
-                    chunk_size=self.chunk_size,
-                    overlap=self.chunk_overlap
+        window = deque()
+        pending: "deque[_PendingFile]" = deque()
+        batch: List[Tuple[_PendingFile, Document]] = []
+        max_in_flight = 2 * self.split_workers
+
+        def submit():
+            texts = [doc.page_content for _, doc in batch]
+            task = (texts, self.chunking_strategy, self.chunk_size, self.tokenizer)
+            window.append((executor.submit(split_batch, task), list(batch)))
+            batch.clear()
+
+        def collect():
+            future, pages = window.popleft()
+            for (entry, doc), spans in zip(pages, future.result()):
+                entry.corpus.add_page(
+                    doc.page_content, doc.metadata.get('source', 'unknown'), doc.metadata.get('page'), spans
                 )
-            elif self.chunking_strategy == "semantic":
-                chunks = self.chunker.semantic_split(text, chunk_size=self.chunk_size)
-            else:  
-                chunks = self.chunker.hybrid_split(
-                    text,
-                    chunk_size=self.chunk_size,
-                    overlap=self.chunk_overlap
+                entry.remaining -= 1
+
+        def completed() -> Iterator[Tuple[str, ChunkCorpus]]:
+            while pending and not pending[0].remaining:
+                entry = pending.popleft()
+                yield entry.source, entry.corpus
+
+        for source, pages in self.iter_files(paths, hashes):
+            entry = _PendingFile(
+                source,
+                ChunkCorpus(self.chunking_strategy, self.chunk_size, self.chunk_overlap, self.tokenizer),
+                len(pages)
+            )
+            pending.append(entry)
+            for doc in pages:
+                batch.append((entry, doc))
+                if len(batch) >= SPLIT_BATCH_PAGES:
+                    submit()
+                    while len(window) > max_in_flight:
+                        collect()
+            yield from completed()
+
+        if batch:
+            submit()
+        while window:
+            collect()
+            yield from completed()
+        yield from completed()
+
+    def _split_executor(self):
+        """Process pool for chunking when split_workers > 1, otherwise a no-op context"""
+        if self.split_workers > 1:
+            return ProcessPoolExecutor(max_workers=self.split_workers)
+        return nullcontext()
+
+    def get_embeddings(self):
+        """
+        Embedding model shared by indexing and queries.
+        Wrapped in a persistent cache unless embedding_cache_dir is None, and in
+        a batching scheduler that keeps embed_concurrency requests in flight.
+        """
+        if self.embeddings is None:
+            embeddings = create_embeddings(self.embedding_model)
+            if is_local_model(self.embedding_model):
+                # Local vectors are cheaper to recompute than to cache or schedule
+                self.embeddings = embeddings
+                return self.embeddings
+            if self.embedding_cache_dir:
+                embeddings = CachedEmbeddings(
+                    embeddings,
+                    cache_path=str(Path(self.embedding_cache_dir) / "embeddings.sqlite3"),
+                    model_name=self.embedding_model,
+                    max_bytes=self.embedding_cache_mb * 1024 * 1024
                 )
-
-            # Create new documents from chunks
-            for i, chunk in enumerate(chunks):
-                split_docs.append(Document(
-                    page_content=chunk,
-                    metadata={
-                        'source': source,
-                        'page': page,
-                        'chunk': i,
-                        'total_chunks': len(chunks)
-                    }
-                ))
-
-        logger.info(f"Created {len(split_docs)} document chunks")
-        return split_docs
+            # The scheduler sits outside the cache so every completed batch is cached
+            # at once, and a failed build resumes without re-embedding it
+            embeddings = BatchedEmbeddings(
+                embeddings,
+                max_in_flight=self.embed_concurrency,
+                tokens_per_minute=self.embed_tokens_per_minute,
+                count_tokens=self.tokenizer.count_batch if self.tokenizer else None
+            )
+            self.embeddings = embeddings
+        return self.embeddings
 
     def create_vector_store(self, documents: List[Document]):
-        """Create vector store from documents"""
+        """Create the configured vector store backend and add documents to it"""
         logger.info("Creating vector store...")
 
         if not HAS_LANGCHAIN:
             logger.error("LangChain not installed")
             return
 
-        embeddings = OpenAIEmbeddings()
+        self.vector_store = self._open_vector_store()
+        self.vector_store.add_documents(documents)
+        if isinstance(self.vector_store, LocalVectorStore):
+            self.vector_store.persist()
 
-        self.vector_store = Chroma.from_documents(
-            documents=documents,
-            embedding=embeddings,
-            persist_directory=self.vector_store_dir
+        logger.info("Vector store created successfully")
+
+    def _open_vector_store(self):
+        """Open (or create) the configured vector store backend in vector_store_dir"""
+        embeddings = self.get_embeddings()
+        if self.vector_store_type == "numpy":
+            return NumpyVectorStore(
+                persist_directory=os.path.join(self.vector_store_dir, "numpy"),
+                embedding_function=embeddings
+            )
+        if self.vector_store_type == "faiss":
+            return FaissHNSWVectorStore(
+                persist_directory=os.path.join(self.vector_store_dir, "faiss"),
+                embedding_function=embeddings,
+                m=self.hnsw_m,
+                ef_search=self.hnsw_ef_search
+            )
+        if self.vector_store_type != "chroma":
+            raise ValueError(f"Unknown vector store type: {self.vector_store_type}")
+        return Chroma(
+            persist_directory=self.vector_store_dir,
+            embedding_function=embeddings
         )
 
-        logger.info("Vector store created successfully")
+    def get_retriever(self, k: int = 5):
+        """
+        Dense retriever, fused with BM25 when hybrid search is on, and fanned
+        out over knowledge-graph expansions of the question in multi-query mode.
+        Results are packed and source-tagged for the answer prompt.
+        """
+        if self.lexical_index is not None:
+            retriever = FusedRetriever(vector_store=self.vector_store, lexical_index=self.lexical_index, k=k)
+        else:
+            retriever = self.vector_store.as_retriever(search_kwargs={"k": k})
+        if self.multi_query:
+            retriever = ExpandedQueryRetriever(
+                retriever=retriever,
+                expand=self.kg_integration.expand_query,
+                k=k,
+                max_variants=self.max_query_variants
+            )
+        # Always last: the answer prompt cites chunks by the source_tag it adds
+        return PackedContextRetriever(
+            retriever=retriever,
+            max_tokens=self.context_token_budget,
+            count_tokens=self.count_tokens
+        )
+
+    def count_tokens(self, text: str) -> int:
+        """
+        Tokens in text, for the context budget and conversation memory.
+        The encoder is loaded on first use; if it cannot be loaded (tiktoken
+        downloads its encodings, which fails offline) tokens are estimated
+        from the text length instead.
+        """
+        if self._token_counter is None:
+            try:
+                self._token_counter = self.tokenizer.count if self.tokenizer else default_token_counter()
+            except Exception as e:
+                logger.warning(f"Token encoder unavailable, estimating token counts: {e}")
+                self._token_counter = estimate_tokens
+        return self._token_counter(text)
+
+    def _create_memory(self, llm):
+        """Conversation memory bounded to memory_token_limit tokens"""
+        memory_class = SummaryTokenBudgetMemory if self.summarize_memory else TokenBudgetMemory
+        return memory_class(
+            llm=llm,
+            count_tokens=self.count_tokens,
+            max_token_limit=self.memory_token_limit,
+            memory_key="chat_history",
+            return_messages=True,
+            output_key="answer"  # Specify which output to store in memory
+        )
+
+    def memory_token_count(self) -> int:
+        """Tokens of conversation history (and summary) the next question will carry"""
+        tokens = count_message_tokens(list(self.memory.chat_memory.messages), self.count_tokens)
+        summary = getattr(self.memory, 'moving_summary_buffer', '')
+        if summary:
+            tokens += self.count_tokens(summary)
+        return tokens
 
     def create_qa_chain(self):
         """Create the QA chain with improved prompts"""
@@ -317,88 +623,236 @@ class RAGChatbot:
             logger.error("LangChain not installed")
             return
 
-        llm = ChatOpenAI(
-            model_name=self.model_name,
-            temperature=self.temperature
+        # The answer LLM streams tokens to any callbacks passed to query();
+        # the condense step does not, so only answer tokens are streamed
+        llm = create_chat_model(
+            self.model_name,
+            self.temperature,
+            base_url=self.llm_base_url,
+            max_tokens=self.llm_max_tokens,
+            streaming=True,
+            stream_usage=True
         )
-
-        # Improved system prompt
-        system_prompt = """You are an expert assistant helping users understand technical documents.
-
-IMPORTANT INSTRUCTIONS:
-1. Always base your answers on the provided document excerpts
-2. If information is not in the documents, clearly state that
-3. Provide specific examples from the documents when possible
-4. Maintain technical accuracy
-5. Be concise but comprehensive
-
-When providing an answer:
-- Start with a direct answer to the question
-- Support it with relevant excerpts from the documents
-- Explain the significance and context
-- Suggest related questions the user might find helpful
-
-Format your response clearly with:
-- **Answer**: Your main response
-- **Key Points**: Bulleted key information
-- **Sources**: Referenced document sections
-- **Related Topics**: Other topics mentioned in the documents"""
-
-        prompt_template = PromptTemplate(
-            input_variables=["context", "question"],
-            template="""System: {system_prompt}
-
-Context from documents:
-{context}
-
-Question: {question}
-
-Answer: """.replace("{system_prompt}", system_prompt)
+        condense_llm = create_chat_model(
+            self.model_name,
+            self.temperature,
+            base_url=self.llm_base_url,
+            tags=["condense_question"]
         )
 
-        # Create memory with output_key specified
-        memory = ConversationBufferMemory(
-            memory_key="chat_history",
-            return_messages=True,
-            output_key="answer"  # Specify which output to store in memory
+        # System prompt first and unchanged; the per-request context and
+        # question come after it in the user message
+        answer_prompt = ChatPromptTemplate.from_messages([
+            ("system", SYSTEM_PROMPT),
+            ("human", "Context from documents:\n{context}\n\nQuestion: {question}"),
+        ])
+        # One line of header per excerpt: "[source p3] text"
+        document_prompt = PromptTemplate(
+            input_variables=["source_tag", "page_content"],
+            template="[{source_tag}] {page_content}"
         )
+
+        memory = self._create_memory(condense_llm)
         self.memory = memory
 
         self.qa_chain = ConversationalRetrievalChain.from_llm(
             llm=llm,
-            retriever=self.vector_store.as_retriever(
-                search_kwargs={"k": 5}  # Retrieve top 5 most relevant chunks
-            ),
+            condense_question_llm=condense_llm,
+            retriever=self.get_retriever(k=5),  # Retrieve top 5 most relevant chunks
             memory=memory,
             return_source_documents=True,
-            verbose=True
+            combine_docs_chain_kwargs={
+                "prompt": answer_prompt,
+                "document_prompt": document_prompt,
+                "document_separator": "\n\n",
+            },
+            # verbose printed every formatted prompt, context included, to stdout
+            verbose=False
         )
+        if self.condense_mode == "auto":
+            generator = self.qa_chain.question_generator
+            self.qa_chain.question_generator = ConditionalQuestionGenerator(
+                llm=generator.llm,
+                prompt=generator.prompt
+            )
 
         logger.info("QA chain created successfully")
 
+    @property
+    def chunking_params(self) -> Dict:
+        """Parameters that change chunk boundaries, recorded per file in the manifest"""
+        return {
+            'chunking_strategy': self.chunking_strategy,
+            'chunk_size': self.chunk_size,
+            'chunk_overlap': self.chunk_overlap,
+            'chunk_unit': self.chunk_unit,
+        }
+
+    def update_index(self, allow_remove_all: bool = False) -> bool:
+        """
+        Bring the vector store in line with the documents directory.
+        Only added or changed files are loaded, split and embedded; chunks of
+        changed and removed files are deleted by ID. Files are re-hashed only
+        when their size or mtime changed. A missing or empty documents
+        directory, or one that would remove every indexed file, leaves the
+        index as it is unless allow_remove_all is set. Returns False if there
+        is nothing indexed and nothing to index.
+        """
+        if not self.documents_dir.is_dir():
+            logger.warning(f"Documents directory {self.documents_dir} not found; using the existing index")
+            return bool(self.manifest.entries)
+
+        files = self.source_files()
+        current = self.manifest.file_hashes(files['pdf'] + files['txt'])
+        params = self.chunking_params
+        diff = self.manifest.diff(current, params)
+
+        if self.manifest.entries and len(diff.removed) == len(self.manifest.entries) and not allow_remove_all:
+            # Most likely an unmounted or wrong documents directory, not a deliberate wipe
+            logger.warning(
+                f"{self.documents_dir} holds none of the {len(self.manifest.entries)} indexed files; "
+                f"using the existing index (rebuild with force_rebuild=True to replace it)"
+            )
+            return True
+
+        logger.info(
+            f"Index status: {len(diff.added)} added, {len(diff.changed)} changed, "
+            f"{len(diff.removed)} removed, {len(diff.unchanged)} unchanged"
+        )
+
+        stale_ids = self.manifest.chunk_ids_for(diff.changed + diff.removed)
+        if stale_ids:
+            self.vector_store.delete(ids=stale_ids)
+            if self.lexical_index is not None:
+                self.lexical_index.remove(stale_ids)
+        for source in diff.changed + diff.removed:
+            self.manifest.remove(source)
+
+        if diff.to_index:
+            self.index_files(diff.to_index, current)
+
+        if not diff.is_empty or self.manifest.stats_updated:
+            self.manifest.save()
+        if not diff.is_empty:
+            if isinstance(self.vector_store, LocalVectorStore):
+                # Saves the id map and compacts once enough chunks are deleted
+                self.vector_store.persist()
+            if self.answer_cache is not None:
+                self.answer_cache.clear()
+
+        if self.lexical_index is not None and (self.sync_lexical_index() or not diff.is_empty):
+            self.lexical_index.save()
+
+        return bool(self.manifest.entries)
+
+    def index_files(self, paths: List[str], hashes: Dict[str, str]):
+        """
+        Stream files through load -> split -> embed -> upsert.
+        Chunks are upserted in batches of embed_batch_size as they are produced,
+        so memory stays flat with corpus size. A file is recorded in the manifest
+        (and the manifest saved) only once all of its chunks have been upserted;
+        chunk IDs are deterministic, so a crash loses at most the current batch.
+        """
+        params = self.chunking_params
+        batch: List[Tuple[ChunkCorpus, int]] = []
+        batch_ids: List[str] = []
+        completed: List[Tuple[str, List[str]]] = []
+        total_chunks = 0
+
+        def flush():
+            if batch:
+                # Chunk text only exists from here until the batch is embedded
+                documents = [corpus[index] for corpus, index in batch]
+                self.vector_store.add_documents(documents, ids=batch_ids)
+                if self.lexical_index is not None:
+                    self.lexical_index.add(batch_ids, [doc.page_content for doc in documents])
+            for source, ids in completed:
+                self.manifest.update(source, hashes[source], params, ids)
+            self.manifest.save()
+            batch.clear()
+            batch_ids.clear()
+            completed.clear()
+
+        with self._split_executor() as executor:
+            for source, corpus in self._iter_chunked_files(paths, hashes, executor):
+                ids = []
+                for index in range(len(corpus)):
+                    metadata = corpus.metadata(index)
+                    doc_id = chunk_id(source, hashes[source], metadata['page'], metadata['chunk'])
+                    ids.append(doc_id)
+                    batch.append((corpus, index))
+                    batch_ids.append(doc_id)
+                    if len(batch) >= self.embed_batch_size:
+                        flush()
+                completed.append((source, ids))
+                total_chunks += len(ids)
+
+        flush()
+        if isinstance(self.vector_store, LocalVectorStore):
+            self.vector_store.persist()
+        logger.info(f"Indexed {total_chunks} chunks from {len(paths)} files")
+
+    def sync_lexical_index(self) -> bool:
+        """
+        Make the BM25 index cover exactly the chunks in the manifest.
+        It is saved after an update rather than per batch, so after an
+        interrupted run (or when hybrid search is first turned on) the missing
+        files are re-split from the page cache; nothing is re-embedded.
+        Returns True if the index changed.
+        """
+        indexed = set(self.manifest.all_chunk_ids())
+        extra = [doc_id for doc_id in self.lexical_index.doc_ids() if doc_id not in indexed]
+        self.lexical_index.remove(extra)
+
+        missing = {
+            source: entry.sha256 for source, entry in self.manifest.entries.items()
+            if any(doc_id not in self.lexical_index for doc_id in entry.chunk_ids)
+        }
+        if missing:
+            logger.info(f"Adding {len(missing)} files to the keyword index")
+            with self._split_executor() as executor:
+                for source, corpus in self._iter_chunked_files(list(missing), missing, executor):
+                    ids, texts = [], []
+                    for index in range(len(corpus)):
+                        metadata = corpus.metadata(index)
+                        ids.append(chunk_id(source, missing[source], metadata['page'], metadata['chunk']))
+                        texts.append(corpus.text(index))
+                    self.lexical_index.add(ids, texts)
+        return bool(extra or missing)
+
     def setup(self, force_rebuild: bool = False):
-        """Set up the chatbot"""
+        """
+        Set up the chatbot.
+        The vector store is updated incrementally from the manifest; force_rebuild,
+        a store built before the manifest existed, or a change of embedding model
+        or vector store type re-indexes everything.
+        """
         logger.info("Setting up chatbot...")
 
-        # Check if vector store exists
-        vector_store_exists = Path(self.vector_store_dir).exists()
+        self.vector_store = self._open_vector_store()
+        self.manifest = IndexManifest(self.vector_store_dir)
+        if self.hybrid_search:
+            self.lexical_index = BM25Index(os.path.join(self.vector_store_dir, "bm25.pkl"))
 
-        if force_rebuild or not vector_store_exists:
+        settings = {'embedding_model': self.embedding_model, 'vector_store_type': self.vector_store_type}
+        # Manifests written before these settings existed were Chroma-backed
+        settings_changed = (
+            self.manifest.settings.get('embedding_model') != self.embedding_model
+            or self.manifest.settings.get('vector_store_type', 'chroma') != self.vector_store_type
+        )
+        if force_rebuild or not self.manifest.exists() or settings_changed:
+            # Vectors from another embedding model or backend cannot be reused
             logger.info("Building vector store from scratch...")
-            documents = self.load_documents()
-            if not documents:
-                logger.error("No documents loaded")
-                return
-
-            split_docs = self.split_documents(documents)
-            self.create_vector_store(split_docs)
-        else:
-            logger.info("Loading existing vector store...")
-            embeddings = OpenAIEmbeddings()
-            self.vector_store = Chroma(
-                persist_directory=self.vector_store_dir,
-                embedding_function=embeddings
-            )
+            self.vector_store.delete_collection()
+            self.vector_store = self._open_vector_store()
+            if self.lexical_index is not None:
+                self.lexical_index.clear()
+            self.manifest.clear()
+            self.manifest.settings = settings
+
+        if not self.update_index(allow_remove_all=force_rebuild):
+            logger.error("No documents loaded")
+            return
 
         self.create_qa_chain()
         logger.info("Chatbot setup complete!")
@@ -479,78 +933,341 @@ Answer: """.replace("{system_prompt}", system_prompt)
         follow_ups = follow_up_templates[:3]  # Return top 3
         return follow_ups
 
-    def query(self, question: str) -> ChatResponse:
+    def query(self, question: str, callbacks: Optional[List] = None) -> ChatResponse:
         """
-        Query the chatbot and return a structured response
+        Query the chatbot and return a structured response.
+        callbacks are passed to the QA chain run (e.g. to receive streamed tokens).
         """
         logger.info(f"Processing query: {question}")
 
         if not self.qa_chain or not self.vector_store:
             logger.error("Chatbot not properly initialized")
-            return ChatResponse(
-                answer="Error: Chatbot not initialized",
-                sources=[],
-                confidence_score=0.0,
-                related_topics=[],
-                follow_up_questions=[]
-            )
+            return self._error_response("Error: Chatbot not initialized")
 
         try:
+            # The answer depends on the question alone on the first turn, or
+            # when the question is self-contained and so is not condensed
+            standalone = not self.memory.chat_memory.messages or (
+                self.condense_mode == "auto" and not needs_condensing(question)
+            )
+            vector = None
+            if standalone:
+                cached, vector = self._cached_answer(question)
+                if cached is not None:
+                    self.memory.save_context({"question": question}, {"answer": cached.answer})
+                    return cached
+
+            timer = StageTimer()
+
             # Expand query using knowledge graph
-            expanded_terms = self.kg_integration.expand_query(question)
+            with timer.stage("expand_query"):
+                expanded_terms = self.kg_integration.expand_query(question)
             logger.info(f"Query expansion: {expanded_terms}")
 
-            # Get answer from QA chain
-            result = self.qa_chain({"question": question})
+            # Get answer from QA chain (retrieval and LLM calls are timed by callback)
+            result = self.qa_chain(
+                {"question": question},
+                callbacks=list(callbacks or []) + [StageTimingHandler(timer)]
+            )
+            try:
+                timer.count("memory_tokens", self.memory_token_count())
+            except Exception as e:
+                # Only a metric: never fail an answered question over it
+                logger.warning(f"Could not count conversation memory tokens: {e}")
+
+            response = self._build_response(
+                question,
+                result.get("answer", ""),
+                result.get("source_documents", []),
+                expanded_terms,
+                timer
+            )
+            if standalone and self.answer_cache is not None:
+                self.answer_cache.put(question, response, vector)
+            return response
+
+        except Exception as e:
+            logger.error(f"Error processing query: {e}")
+            return self._error_response(f"Error processing query: {str(e)}")
 
-            answer = result.get("answer", "")
-            source_docs = result.get("source_documents", [])
+    def _build_response(
+        self,
+        question: str,
+        answer: str,
+        source_docs: List[Document],
+        expanded_terms: List[str],
+        timer: Optional[StageTimer] = None
+    ) -> ChatResponse:
+        """
+        Assemble a ChatResponse from an answer and the chunks it was based on.
+        Stage timings and counts from timer go into metadata and the latency histogram.
+        """
+        timer = timer or StageTimer()
 
-            # Extract structured source information
+        # Extract structured source information
+        with timer.stage("extract_sources"):
             sources = self.extract_sources(source_docs)
 
-            # Calculate confidence
+        # Calculate confidence
+        with timer.stage("confidence"):
             confidence = self.calculate_confidence(answer, sources)
 
-            # Generate related topics from knowledge graph
-            related_topics = expanded_terms[1:4] if len(expanded_terms) > 1 else []
+        # Generate related topics from knowledge graph
+        related_topics = expanded_terms[1:4] if len(expanded_terms) > 1 else []
 
-            # Generate follow-up questions
+        # Generate follow-up questions
+        with timer.stage("follow_ups"):
             follow_ups = self.generate_follow_up_questions(question, answer)
 
-            response = ChatResponse(
-                answer=answer,
-                sources=sources,
-                confidence_score=confidence,
-                related_topics=related_topics,
-                follow_up_questions=follow_ups,
-                metadata={
-                    'timestamp': datetime.now().isoformat(),
-                    'model': self.model_name,
-                    'chunking_strategy': self.chunking_strategy
-                }
+        metrics = timer.finish()
+        self.latency.record(metrics['timings_ms'])
+
+        return ChatResponse(
+            answer=answer,
+            sources=sources,
+            confidence_score=confidence,
+            related_topics=related_topics,
+            follow_up_questions=follow_ups,
+            metadata={
+                'timestamp': datetime.now().isoformat(),
+                'model': self.model_name,
+                'chunking_strategy': self.chunking_strategy,
+                **metrics
+            }
+        )
+
+    def latency_report(self) -> str:
+        """Per-stage latency percentiles over all queries answered so far"""
+        return self.latency.dump()
+
+    def _cached_answer(self, question: str):
+        """Look a standalone question up in the answer cache; returns (response or None, embedding)"""
+        if self.answer_cache is None:
+            return None, None
+        # Exact repeats need no embedding call
+        cached = self.answer_cache.get_exact(question)
+        if cached is not None:
+            return cached, None
+        # The embedding is cached, so retrieval of a miss reuses it
+        vector = self.get_embeddings().embed_query(question) if self.answer_cache.semantic else None
+        return self.answer_cache.get(question, vector), vector
+
+    def _error_response(self, message: str) -> ChatResponse:
+        return ChatResponse(
+            answer=message,
+            sources=[],
+            confidence_score=0.0,
+            related_topics=[],
+            follow_up_questions=[],
+            metadata={'error': message}
+        )
+
+    def retrieve_many(
+        self,
+        questions: List[str],
+        k: int = 5,
+        vectors: Optional[List[List[float]]] = None
+    ) -> List[List[Document]]:
+        """
+        Retrieve chunks for many questions at once.
+        All questions are embedded together as queries (unless vectors are
+        given) and searched with one vector store call (see _search_by_vectors).
+        """
+        if not questions:
+            return []
+        # Multi-query expansion is not applied to batches; packing is applied below
+        retriever = self.get_retriever(k=k)
+        while isinstance(retriever, (PackedContextRetriever, ExpandedQueryRetriever)):
+            retriever = retriever.retriever
+        fused = isinstance(retriever, FusedRetriever)
+        fetch_k = retriever.fetch_k if fused else k
+
+        if vectors is None:
+            vectors = embed_queries(self.get_embeddings(), questions)
+        dense = self._search_by_vectors(vectors, fetch_k)
+
+        if fused:
+            dense = [
+                retriever.fuse(docs, self.lexical_index.search(question, fetch_k))
+                for question, docs in zip(questions, dense)
+            ]
+        return [assemble_context(docs, self.context_token_budget, self.count_tokens) for docs in dense]
+
+    def _search_by_vectors(self, vectors: List[List[float]], k: int) -> List[List[Document]]:
+        """
+        Top-k chunks for each query vector. The local stores score every vector
+        with one matrix product (or FAISS call) and Chroma takes them in one
+        query; other stores are searched per vector.
+        """
+        if not vectors:
+            return []
+        if isinstance(self.vector_store, NumpyVectorStore):
+            return [[doc for doc, _ in hits] for hits in self.vector_store.search_by_vectors(vectors, k)]
+        if isinstance(self.vector_store, Chroma):
+            results = self.vector_store._collection.query(
+                query_embeddings=vectors, n_results=k, include=["documents", "metadatas"]
             )
+            return [
+                [
+                    Document(page_content=text, metadata=metadata or {}, id=doc_id)
+                    for text, metadata, doc_id in zip(texts, metadatas, ids)
+                ]
+                for texts, metadatas, ids in zip(results['documents'], results['metadatas'], results['ids'])
+            ]
+        return [self.vector_store.similarity_search_by_vector(vector, k=k) for vector in vectors]
+
+    def query_many(self, questions: List[str], max_concurrency: int = 4) -> List[ChatResponse]:
+        """
+        Answer a list of independent questions (no chat history).
+        Questions are embedded once for the answer cache and retrieval; cache
+        misses are retrieved in one batch and up to max_concurrency LLM calls
+        run at once. Responses come back in input order; a failing question
+        (including one that cannot be embedded) gets an error response without
+        affecting the others.
+        """
+        if not self.qa_chain or not self.vector_store:
+            logger.error("Chatbot not properly initialized")
+            return [self._error_response("Error: Chatbot not initialized") for _ in questions]
+        if not questions:
+            return []
 
+        logger.info(f"Processing {len(questions)} queries")
+        timers = [StageTimer() for _ in questions]
+        try:
+            start = time.perf_counter()
+            # Query embeddings, as query() uses, so cache keys and vectors match
+            vectors = embed_queries(self.get_embeddings(), questions, return_exceptions=True)
+            cached = []
+            for index, (question, vector) in enumerate(zip(questions, vectors)):
+                if isinstance(vector, Exception):
+                    logger.error(f"Error embedding query {index + 1}: {vector}")
+                    cached.append(self._error_response(f"Error processing query: {str(vector)}"))
+                else:
+                    cached.append(self.answer_cache.get(question, vector) if self.answer_cache is not None else None)
+            misses = [i for i, response in enumerate(cached) if response is None]
+            retrieved = dict(zip(misses, self.retrieve_many(
+                [questions[i] for i in misses], vectors=[vectors[i] for i in misses]
+            )))
+            # Every question waited for the whole batch
+            elapsed = time.perf_counter() - start
+            for i, docs in retrieved.items():
+                timers[i].add("retrieval", elapsed)
+                timers[i].count("retrieved_chunks", len(docs))
+        except Exception as e:
+            logger.error(f"Error retrieving documents: {e}")
+            return [self._error_response(f"Error processing query: {str(e)}") for _ in questions]
+
+        def answer(index: int) -> ChatResponse:
+            if cached[index] is not None:
+                return cached[index]
+            question, docs, timer = questions[index], retrieved[index], timers[index]
+            try:
+                with timer.stage("expand_query"):
+                    expanded_terms = self.kg_integration.expand_query(question)
+                result = self.qa_chain.combine_docs_chain.invoke(
+                    {"input_documents": docs, "question": question},
+                    config={"callbacks": [StageTimingHandler(timer)]}
+                )
+                response = self._build_response(question, result.get("output_text", ""), docs, expanded_terms, timer)
+                if self.answer_cache is not None:
+                    self.answer_cache.put(question, response, vectors[index])
+                return response
+            except Exception as e:
+                logger.error(f"Error processing query {index + 1}: {e}")
+                return self._error_response(f"Error processing query: {str(e)}")
+
+        with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+            return list(executor.map(answer, range(len(questions))))
+
+    async def aquery(
+        self,
+        question: str,
+        chat_history: Optional[Sequence[Tuple[str, str]]] = None
+    ) -> ChatResponse:
+        """
+        Async version of query() that never blocks the event loop.
+        The conversation is passed in as (question, answer) pairs instead of
+        using self.memory, so one chatbot can serve many conversations at once;
+        the caller appends the new turn. Retrieval and the LLM call use the
+        chains' native async paths.
+        """
+        if not self.qa_chain or not self.vector_store:
+            logger.error("Chatbot not properly initialized")
+            return self._error_response("Error: Chatbot not initialized")
+
+        try:
+            vector = None
+            if not chat_history:
+                cached, vector = await asyncio.to_thread(self._cached_answer, question)
+                if cached is not None:
+                    return cached
+
+            timer = StageTimer()
+            config = {"callbacks": [StageTimingHandler(timer)]}
+
+            with timer.stage("expand_query"):
+                expanded_terms = await asyncio.to_thread(self.kg_integration.expand_query, question)
+
+            standalone = question
+            if chat_history:
+                # Same condense step the sync chain runs against its memory
+                result = await self.qa_chain.question_generator.ainvoke({
+                    "question": question,
+                    "chat_history": _format_chat_history(chat_history),
+                }, config=config)
+                standalone = result.get("text", question)
+
+            docs = await self.get_retriever(k=5).ainvoke(standalone, config=config)
+            result = await self.qa_chain.combine_docs_chain.ainvoke(
+                {"input_documents": docs, "question": standalone}, config=config
+            )
+            response = self._build_response(question, result.get("output_text", ""), docs, expanded_terms, timer)
+            if not chat_history and self.answer_cache is not None:
+                self.answer_cache.put(question, response, vector)
             return response
 
         except Exception as e:
             logger.error(f"Error processing query: {e}")
-            return ChatResponse(
-                answer=f"Error processing query: {str(e)}",
-                sources=[],
-                confidence_score=0.0,
-                related_topics=[],
-                follow_up_questions=[]
-            )
+            return self._error_response(f"Error processing query: {str(e)}")
+
+    def query_stream(self, question: str) -> Iterator[StreamEvent]:
+        """
+        Stream the answer to a question.
+        Yields a "token" event per answer token as the LLM produces it, then a
+        single "done" event carrying the full ChatResponse (sources, confidence,
+        related topics). The chain runs on a background thread.
+        """
+        tokens: "queue.Queue[Optional[str]]" = queue.Queue()
+        result: Dict[str, ChatResponse] = {}
+
+        def run():
+            try:
+                result['response'] = self.query(question, callbacks=[TokenQueueHandler(tokens)])
+            finally:
+                tokens.put(None)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        while True:
+            token = tokens.get()
+            if token is None:
+                break
+            yield StreamEvent(type="token", token=token)
+        thread.join()
+
+        response = result.get('response') or self._error_response("Error processing query")
+        yield StreamEvent(type="done", response=response)
 
     def format_response(self, response: ChatResponse) -> str:
         """Format the response for display"""
-        output = []
+        return self.format_answer_header() + "\n" + response.answer + self.format_trailer(response)
+
+    def format_answer_header(self) -> str:
+        return "\n" + "="*70 + "\nANSWER\n" + "="*70
 
-        output.append("\n" + "="*70)
-        output.append("ANSWER")
-        output.append("="*70)
-        output.append(response.answer)
+    def format_trailer(self, response: ChatResponse) -> str:
+        """Everything format_response shows after the answer text"""
+        output = [""]
 
         output.append("\n" + "-"*70)
         output.append(f"CONFIDENCE SCORE: {response.confidence_score:.1%}")
@@ -584,7 +1301,7 @@ Answer: """.replace("{system_prompt}", system_prompt)
         print("\n" + "="*70)
         print(" RAG CHATBOT - DOCUMENT KNOWLEDGE ASSISTANT")
         print("="*70)
-        print("\nType your questions below. Press Ctrl+C or type 'quit' to exit.\n")
+        print("\nType your questions below. Type 'stats' for query latencies; Ctrl+C or 'quit' to exit.\n")
 
         while True:
             try:
@@ -597,12 +1314,30 @@ Answer: """.replace("{system_prompt}", system_prompt)
                     print("\nGoodbye! Thank you for using the chatbot.")
                     break
 
-                # Process query
-                response = self.query(user_input)
+                if user_input.lower() == 'stats':
+                    print("\n" + self.latency_report())
+                    print(f"Conversation memory: {self.memory_token_count()} tokens "
+                          f"(limit {self.memory_token_limit})\n")
+                    continue
 
-                # Format and display response
-                formatted_response = self.format_response(response)
-                print(formatted_response)
+                # Print the answer as it streams, then sources and topics. The
+                # header waits for the first token so log output during
+                # retrieval does not land between it and the answer
+                streamed = False
+                response = None
+                for event in self.query_stream(user_input):
+                    if event.type == "token":
+                        if not streamed:
+                            print(self.format_answer_header())
+                            streamed = True
+                        print(event.token, end="", flush=True)
+                    else:
+                        response = event.response
+
+                if not streamed:
+                    print(self.format_answer_header())
+                    print(response.answer, end="")
+                print(self.format_trailer(response))
 
             except KeyboardInterrupt:
                 print("\n\nGoodbye! Thank you for using the chatbot.")
@@ -0,0 +1,325 @@
+"""
+Retrieval
+Lexical (BM25) search and rank fusion with the dense vector store.
+
+Exact identifiers such as "CBDa", "GC-MS" or "2 mg/kg" are often ranked low
+by embeddings alone. BM25Index keeps an inverted index over the same chunks,
+and FusedRetriever merges its ranking with the vector store's by reciprocal
+rank. ExpandedQueryRetriever fans a question out into knowledge-graph
+expanded variants and fuses their results the same way.
+"""
+
+import math
+import os
+import pickle
+from array import array
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import logging
+
+from chatbot.embeddings import tokenize
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+try:
+    from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+    from langchain_core.documents import Document
+    from langchain_core.retrievers import BaseRetriever
+except ImportError:
+    AsyncCallbackManagerForRetrieverRun = None
+    CallbackManagerForRetrieverRun = None
+    Document = None
+    BaseRetriever = object
+
+logger = logging.getLogger(__name__)
+
+# Too common to rank anything; skipping them keeps posting lists short
+STOP_WORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the "
+    "this to was were which with".split()
+)
+
+
+def reciprocal_rank_fusion(rankings: Iterable[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Merge ranked ID lists: each list contributes 1 / (k + rank) per ID"""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class BM25Index:
+    """
+    In-memory inverted index with Okapi BM25 scoring, keyed by chunk ID.
+
+    Postings are append-only arrays per term; removed chunks are tombstoned
+    and dropped when the index is compacted on save. Scoring a query is a
+    handful of vectorised NumPy operations over the query terms' postings.
+    """
+
+    def __init__(self, path: Optional[str] = None, k1: float = 1.5, b: float = 0.75):
+        if not HAS_NUMPY:
+            raise ImportError("numpy not installed. Install with: pip install numpy")
+        self.path = Path(path) if path else None
+        self.k1 = k1
+        self.b = b
+        self.clear()
+        if self.path and self.path.exists():
+            self.load()
+
+    def clear(self):
+        # Internal document number -> chunk ID (None once removed)
+        self.ids: List[Optional[str]] = []
+        self.rows: Dict[str, int] = {}
+        self.lengths = array('i')
+        # term -> (document numbers, term frequencies)
+        self.postings: Dict[str, Tuple[array, array]] = {}
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self.rows
+
+    def doc_ids(self) -> List[str]:
+        return list(self.rows)
+
+    def add(self, ids: List[str], texts: List[str]):
+        """Index texts under their chunk IDs; existing IDs are replaced"""
+        self.remove([doc_id for doc_id in ids if doc_id in self.rows])
+        postings = self.postings
+        for doc_id, text in zip(ids, texts):
+            row = len(self.ids)
+            counts = Counter(tokenize(text))
+            for word in STOP_WORDS.intersection(counts):
+                del counts[word]
+            for term, tf in counts.items():
+                entry = postings.get(term)
+                if entry is None:
+                    entry = postings[term] = (array('i'), array('i'))
+                entry[0].append(row)
+                entry[1].append(tf)
+            length = sum(counts.values())
+            self.ids.append(doc_id)
+            self.rows[doc_id] = row
+            self.lengths.append(length)
+            self.total_length += length
+
+    def remove(self, ids: Iterable[str]):
+        for doc_id in ids:
+            row = self.rows.pop(doc_id, None)
+            if row is not None:
+                self.ids[row] = None
+                self.total_length -= self.lengths[row]
+
+    def search(self, query: str, k: int = 20) -> List[Tuple[str, float]]:
+        """Top-k (chunk ID, BM25 score) for a query"""
+        n_docs = len(self.rows)
+        terms = {token for token in tokenize(query) if token not in STOP_WORDS and token in self.postings}
+        if not n_docs or not terms:
+            return []
+
+        avg_length = self.total_length / n_docs
+        lengths = np.frombuffer(self.lengths, dtype=np.int32)
+        all_docs, all_scores = [], []
+        for term in terms:
+            docs_array, tfs_array = self.postings[term]
+            docs = np.frombuffer(docs_array, dtype=np.int32)
+            tf = np.frombuffer(tfs_array, dtype=np.int32).astype(np.float32)
+            # df still counts removed chunks until the next compaction
+            df = len(docs)
+            idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * lengths[docs] / avg_length)
+            all_docs.append(docs)
+            all_scores.append(idf * tf * (self.k1 + 1.0) / (tf + norm))
+
+        docs = np.concatenate(all_docs)
+        unique_docs, inverse = np.unique(docs, return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(all_scores))
+
+        ids = self.ids
+        # Enough candidates to still fill k after skipping every removed chunk
+        limit = min(len(scores), k + len(ids) - n_docs)
+        order = np.argpartition(-scores, limit - 1)[:limit] if limit < len(scores) else np.arange(len(scores))
+        order = order[np.argsort(-scores[order])]
+        results = []
+        for position in order:
+            doc_id = ids[unique_docs[position]]
+            if doc_id is not None:
+                results.append((doc_id, float(scores[position])))
+                if len(results) == k:
+                    break
+        return results
+
+    def compact(self):
+        """Drop removed chunks from the postings and renumber the rest"""
+        if len(self.rows) == len(self.ids):
+            return
+        live = np.array([doc_id is not None for doc_id in self.ids], dtype=bool)
+        renumber = np.cumsum(live, dtype=np.int32) - 1
+        postings = {}
+        for term, (docs_array, tfs_array) in self.postings.items():
+            docs = np.frombuffer(docs_array, dtype=np.int32)
+            keep = live[docs]
+            if keep.any():
+                postings[term] = (
+                    array('i', renumber[docs[keep]].tobytes()),
+                    array('i', np.frombuffer(tfs_array, dtype=np.int32)[keep].tobytes()),
+                )
+        self.postings = postings
+        self.lengths = array('i', np.frombuffer(self.lengths, dtype=np.int32)[live].tobytes())
+        self.ids = [doc_id for doc_id in self.ids if doc_id is not None]
+        self.rows = {doc_id: row for row, doc_id in enumerate(self.ids)}
+
+    def load(self):
+        try:
+            with open(self.path, 'rb') as f:
+                state = pickle.load(f)
+            self.ids = state['ids']
+            self.lengths = state['lengths']
+            self.postings = state['postings']
+            self.rows = {doc_id: row for row, doc_id in enumerate(self.ids) if doc_id is not None}
+            self.total_length = sum(self.lengths[row] for row in self.rows.values())
+        except Exception as e:
+            logger.warning(f"Could not read BM25 index {self.path}: {e}")
+            self.clear()
+
+    def save(self):
+        """Compact and write the index atomically"""
+        if not self.path:
+            return
+        self.compact()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix('.tmp')
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(
+                {'ids': self.ids, 'lengths': self.lengths, 'postings': self.postings},
+                f, protocol=pickle.HIGHEST_PROTOCOL
+            )
+        os.replace(tmp_path, self.path)
+
+
+def document_key(document) -> str:
+    """Fusion key for a retrieved chunk: its store ID, else source/page/chunk"""
+    if getattr(document, 'id', None):
+        return document.id
+    metadata = document.metadata
+    return f"{metadata.get('source')}:{metadata.get('page')}:{metadata.get('chunk')}"
+
+
+class FusedRetriever(BaseRetriever):
+    """
+    Dense + BM25 retrieval merged by reciprocal rank fusion.
+    Each side fetches fetch_k candidates; chunks only found lexically are read
+    back from the vector store by ID.
+    """
+
+    vector_store: Any
+    lexical_index: Any
+    k: int = 5
+    fetch_k: int = 20
+    rrf_k: int = 60
+
+    def _rank(self, dense: List[Document], lexical: List[Tuple[str, float]]) -> Tuple[Dict[str, Document], List[str]]:
+        by_key = {document_key(doc): doc for doc in dense}
+        fused = reciprocal_rank_fusion(
+            [list(by_key), [doc_id for doc_id, _ in lexical]], k=self.rrf_k
+        )[:self.k]
+        return by_key, [key for key, _ in fused]
+
+    def fuse(self, dense: List[Document], lexical: List[Tuple[str, float]]) -> List[Document]:
+        by_key, keys = self._rank(dense, lexical)
+        missing = [key for key in keys if key not in by_key]
+        if missing:
+            for doc in self.vector_store.get_by_ids(missing):
+                by_key[document_key(doc)] = doc
+        return [by_key[key] for key in keys if key in by_key]
+
+    async def afuse(self, dense: List[Document], lexical: List[Tuple[str, float]]) -> List[Document]:
+        by_key, keys = self._rank(dense, lexical)
+        missing = [key for key in keys if key not in by_key]
+        if missing:
+            for doc in await self.vector_store.aget_by_ids(missing):
+                by_key[document_key(doc)] = doc
+        return [by_key[key] for key in keys if key in by_key]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        dense = self.vector_store.similarity_search(query, k=self.fetch_k)
+        lexical = self.lexical_index.search(query, self.fetch_k)
+        return self.fuse(dense, lexical)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        dense = await self.vector_store.asimilarity_search(query, k=self.fetch_k)
+        # BM25 takes well under a millisecond, so it runs inline
+        lexical = self.lexical_index.search(query, self.fetch_k)
+        return await self.afuse(dense, lexical)
+
+
+class ExpandedQueryRetriever(BaseRetriever):
+    """
+    Retrieve for a question and its expanded variants concurrently, then
+    deduplicate and fuse the rankings by reciprocal rank.
+
+    expand(question) returns the question followed by related terms (as
+    KnowledgeGraphIntegration.expand_query does); each term becomes a variant
+    "question term". The variants run through the base retriever's batch(),
+    so the fan-out costs about one retrieval of wall time.
+    """
+
+    retriever: Any
+    expand: Callable[[str], List[str]]
+    k: int = 5
+    # Expanded variants retrieved in addition to the question itself
+    max_variants: int = 3
+    rrf_k: int = 60
+
+    def variants(self, query: str) -> List[str]:
+        variants = [query]
+        for term in self.expand(query)[1:]:
+            variant = f"{query} {term}"
+            if variant not in variants:
+                variants.append(variant)
+            if len(variants) > self.max_variants:
+                break
+        return variants
+
+    def _merge(self, results: List[List[Document]]) -> List[Document]:
+        by_key: Dict[str, Document] = {}
+        rankings = []
+        for docs in results:
+            ranking = []
+            for doc in docs:
+                key = document_key(doc)
+                by_key.setdefault(key, doc)
+                ranking.append(key)
+            rankings.append(ranking)
+        return [by_key[key] for key, _ in reciprocal_rank_fusion(rankings, k=self.rrf_k)[:self.k]]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        variants = self.variants(query)
+        if len(variants) == 1:
+            return self.retriever.invoke(query, config={"callbacks": run_manager.get_child()})[:self.k]
+        results = self.retriever.batch(
+            variants, config={"callbacks": run_manager.get_child(), "max_concurrency": len(variants)}
+        )
+        return self._merge(results)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        variants = self.variants(query)
+        results = await self.retriever.abatch(variants, config={"callbacks": run_manager.get_child()})
+        return self._merge(results)
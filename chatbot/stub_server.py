@@ -0,0 +1,259 @@
+"""
+Stub OpenAI Server
+A local stand-in for the OpenAI embeddings and chat-completions APIs, for
+exercising index builds and load-testing the chatbot without network access
+or API spend.
+
+Run it and point the OpenAI client at it:
+
+    python -m chatbot.stub_server --port 8099 --latency 0.05 --token-rate 50 --rate-limit-every 20
+    export OPENAI_BASE_URL=http://127.0.0.1:8099/v1 OPENAI_API_KEY=stub
+    # or for the chat model only: export LLM_BASE_URL=http://127.0.0.1:8099/v1
+
+Vectors and completions are derived from a hash of the input, so the same
+request always gets the same response. Completions stream over SSE when the
+request sets "stream", at token_rate tokens per second.
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def stub_embedding(item, dimensions: int) -> List[float]:
+    """Deterministic unit vector for a text (or a list of token IDs, as langchain may send)"""
+    payload = item if isinstance(item, str) else json.dumps(item)
+    rng = random.Random(hashlib.sha256(payload.encode('utf-8')).digest())
+    vector = [rng.gauss(0.0, 1.0) for _ in range(dimensions)]
+    norm = sum(v * v for v in vector) ** 0.5 or 1.0
+    return [v / norm for v in vector]
+
+
+def stub_completion(prompt: str, n_tokens: int) -> List[str]:
+    """Deterministic completion tokens, drawn from the prompt's own words"""
+    words = prompt.split() or ["stub"]
+    rng = random.Random(hashlib.sha256(prompt.encode('utf-8')).digest())
+    return [("" if i == 0 else " ") + rng.choice(words) for i in range(n_tokens)]
+
+
+def _message_text(message: dict) -> str:
+    content = message.get('content') or ""
+    if isinstance(content, list):
+        # Content parts: [{"type": "text", "text": ...}, ...]
+        content = " ".join(part.get('text', '') for part in content if isinstance(part, dict))
+    return content
+
+
+class StubServer:
+    """OpenAI-compatible stand-in server running on a background thread"""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        dimensions: int = 256,
+        rate_limit_every: int = 0,
+        token_rate: float = 0.0,
+        completion_tokens: int = 64,
+    ):
+        # Seconds before any response (time to first token for completions)
+        self.latency = latency
+        self.dimensions = dimensions
+        # Completion tokens per second (0 = no delay) and tokens per completion
+        self.token_rate = token_rate
+        self.completion_tokens = completion_tokens
+        # Every Nth request is answered with a 429, to exercise client backoff
+        self.rate_limit_every = rate_limit_every
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def _next_request_is_limited(self) -> bool:
+        with self._lock:
+            self.requests += 1
+            return bool(self.rate_limit_every) and self.requests % self.rate_limit_every == 0
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+            def _send_json(self, status: int, body: dict, headers: Optional[dict] = None):
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                try:
+                    request = json.loads(self.rfile.read(length) or b'{}')
+                except json.JSONDecodeError:
+                    self._send_json(400, {'error': {'message': 'invalid JSON'}})
+                    return
+
+                if server._next_request_is_limited():
+                    self._send_json(
+                        429,
+                        {'error': {'message': 'Rate limit reached (stub)', 'type': 'rate_limit_exceeded'}},
+                        {'Retry-After': '1'}
+                    )
+                    return
+
+                if server.latency:
+                    time.sleep(server.latency)
+
+                path = self.path.rstrip('/')
+                if path.endswith('/embeddings'):
+                    server.handle_embeddings(self, request)
+                elif path.endswith('/chat/completions'):
+                    server.handle_chat_completions(self, request)
+                else:
+                    self._send_json(404, {'error': {'message': f'Unknown endpoint {self.path}'}})
+
+        return Handler
+
+    def handle_embeddings(self, handler, request: dict):
+        inputs = request.get('input', [])
+        # A single string, a single token list, or a list of either
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        dimensions = request.get('dimensions') or self.dimensions
+        data = [
+            {'object': 'embedding', 'index': i, 'embedding': stub_embedding(item, dimensions)}
+            for i, item in enumerate(inputs)
+        ]
+        tokens = sum(len(item) if isinstance(item, list) else len(item.split()) for item in inputs)
+        handler._send_json(200, {
+            'object': 'list',
+            'data': data,
+            'model': request.get('model', 'stub-embedding'),
+            'usage': {'prompt_tokens': tokens, 'total_tokens': tokens},
+        })
+
+    def handle_chat_completions(self, handler, request: dict):
+        prompt = "\n".join(_message_text(message) for message in request.get('messages', []))
+        limit = request.get('max_completion_tokens') or request.get('max_tokens')
+        n_tokens = min(limit, self.completion_tokens) if limit else self.completion_tokens
+        tokens = stub_completion(prompt, n_tokens)
+        prompt_tokens = len(prompt.split())
+        usage = {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': len(tokens),
+            'total_tokens': prompt_tokens + len(tokens),
+        }
+        finish_reason = 'length' if limit and n_tokens >= limit else 'stop'
+        delay = 1.0 / self.token_rate if self.token_rate else 0.0
+        base = {
+            'id': f"chatcmpl-{uuid.uuid4().hex[:24]}",
+            'created': int(time.time()),
+            'model': request.get('model', 'stub-chat'),
+        }
+
+        if not request.get('stream'):
+            time.sleep(delay * len(tokens))
+            handler._send_json(200, {
+                **base,
+                'object': 'chat.completion',
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': "".join(tokens)},
+                    'finish_reason': finish_reason,
+                }],
+                'usage': usage,
+            })
+            return
+
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'text/event-stream')
+        handler.send_header('Cache-Control', 'no-cache')
+        handler.end_headers()
+
+        def send(choices: list, **extra):
+            chunk = {**base, 'object': 'chat.completion.chunk', 'choices': choices, **extra}
+            handler.wfile.write(b"data: " + json.dumps(chunk).encode('utf-8') + b"\n\n")
+            handler.wfile.flush()
+
+        try:
+            send([{'index': 0, 'delta': {'role': 'assistant', 'content': ''}, 'finish_reason': None}])
+            for token in tokens:
+                if delay:
+                    time.sleep(delay)
+                send([{'index': 0, 'delta': {'content': token}, 'finish_reason': None}])
+            send([{'index': 0, 'delta': {}, 'finish_reason': finish_reason}])
+            if (request.get('stream_options') or {}).get('include_usage'):
+                send([], usage=usage)
+            handler.wfile.write(b"data: [DONE]\n\n")
+            handler.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            logger.debug("Client closed the stream")
+        # No Content-Length on a stream: closing the connection ends the response
+        handler.close_connection = True
+
+    def start(self) -> "StubServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info(f"Stub server listening on {self.base_url}")
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "StubServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the OpenAI API")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument('--dimensions', type=int, default=256)
+    parser.add_argument('--rate-limit-every', type=int, default=0, help="answer every Nth request with a 429")
+    parser.add_argument('--token-rate', type=float, default=0.0, help="completion tokens per second (0 = instant)")
+    parser.add_argument('--completion-tokens', type=int, default=64, help="tokens per completion")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    server = StubServer(
+        args.host, args.port, args.latency, args.dimensions, args.rate_limit_every,
+        token_rate=args.token_rate, completion_tokens=args.completion_tokens
+    )
+    print(f"Serving on {server.base_url} (Ctrl+C to stop)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
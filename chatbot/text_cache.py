@@ -0,0 +1,97 @@
+"""
+Page Text Cache
+Content-addressed cache of per-page PDF text, shared by the knowledge graph
+builder (run_local_workflow.py) and the chatbot's vector store build.
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import List, Optional
+import logging
+
+from chatbot.index_manifest import file_sha256
+
+logger = logging.getLogger(__name__)
+
+# Bump when the way text is extracted changes, to invalidate cached pages
+EXTRACTOR_REVISION = 1
+
+try:
+    import pypdf as _pdf_lib
+    HAS_PDF_LIB = True
+except ImportError:
+    try:
+        import PyPDF2 as _pdf_lib
+        HAS_PDF_LIB = True
+    except ImportError:
+        _pdf_lib = None
+        HAS_PDF_LIB = False
+
+
+def extractor_version() -> str:
+    """Identify the extractor, so cache entries from other libraries or revisions are not reused"""
+    if not HAS_PDF_LIB:
+        return f"none-r{EXTRACTOR_REVISION}"
+    return f"{_pdf_lib.__name__.lower()}-{getattr(_pdf_lib, '__version__', '0')}-r{EXTRACTOR_REVISION}"
+
+
+def extract_pdf_pages(path: str) -> List[str]:
+    """Extract the text of every page; pages that fail to extract are left empty"""
+    if not HAS_PDF_LIB:
+        raise ImportError("pypdf not installed. Install with: pip install pypdf")
+
+    reader = _pdf_lib.PdfReader(str(path))
+    pages = []
+    for page_num, page in enumerate(reader.pages):
+        try:
+            pages.append(page.extract_text() or "")
+        except Exception as e:
+            logger.warning(f"Could not extract text from page {page_num} of {path}: {e}")
+            pages.append("")
+    return pages
+
+
+class PageTextCache:
+    """On-disk page text keyed by file content hash and extractor version"""
+
+    def __init__(self, cache_dir: Optional[str] = None):
+        if cache_dir is None:
+            cache_dir = Path(__file__).parent.parent / ".page_cache"
+        self.cache_dir = Path(cache_dir)
+        self.version = extractor_version()
+
+    def _entry_path(self, sha256: str) -> Path:
+        return self.cache_dir / sha256[:2] / f"{sha256}.{self.version}.json"
+
+    def get(self, sha256: str) -> Optional[List[str]]:
+        """Return cached pages for a file hash, or None on a miss"""
+        entry = self._entry_path(sha256)
+        if not entry.exists():
+            return None
+        try:
+            with open(entry, encoding='utf-8') as f:
+                return json.load(f)['pages']
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable page cache entry {entry}: {e}")
+            return None
+
+    def put(self, sha256: str, pages: List[str]):
+        """Store pages; written via a temp file so concurrent readers never see partial entries"""
+        entry = self._entry_path(sha256)
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = entry.with_name(f"{entry.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': self.version, 'pages': pages}, f)
+        os.replace(tmp_path, entry)
+
+    def get_pages(self, path: str, sha256: Optional[str] = None) -> List[str]:
+        """Return the page texts of a PDF, extracting and caching them on a miss"""
+        if sha256 is None:
+            sha256 = file_sha256(path)
+
+        pages = self.get(sha256)
+        if pages is None:
+            pages = extract_pdf_pages(path)
+            self.put(sha256, pages)
+        return pages
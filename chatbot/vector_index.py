@@ -0,0 +1,797 @@
+"""
+Local Vector Stores
+In-process vector store backends for the RAG chatbot.
+
+NumpyVectorStore keeps every chunk embedding in one contiguous float32 matrix
+stored as a memory-mapped .npy file. Top-k search is one matrix-vector product
+plus argpartition. Startup only maps the files, and processes that open the same
+directory share the pages through the OS page cache.
+
+FaissHNSWVectorStore builds a FAISS HNSW graph over the same matrix for
+approximate search at millions of chunks.
+
+Opening a store only maps its files, up to the last row every file holds,
+so readers never change anything a writer may be in the middle of. Writes
+take an exclusive lock file; taking it first finishes whatever a crashed
+writer left behind (a half-written append is trimmed away, so at most the
+batch being written is lost). Deleted rows are tombstoned and compacted away
+on persist() once they make up a quarter of the store.
+"""
+
+import json
+import os
+import pickle
+import shutil
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import logging
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+try:
+    import faiss
+    HAS_FAISS = True
+except ImportError:
+    HAS_FAISS = False
+
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:
+    # No advisory locks (Windows): only one process may write to a store at a time
+    HAS_FCNTL = False
+
+try:
+    from langchain_core.documents import Document
+    from langchain_core.vectorstores import VectorStore
+    HAS_LANGCHAIN = True
+except ImportError:
+    Document = None
+    VectorStore = object
+    HAS_LANGCHAIN = False
+
+logger = logging.getLogger(__name__)
+
+# Fixed .npy header size, so the row count can be rewritten in place as rows are appended
+_NPY_HEADER_BYTES = 128
+# persist() compacts the store when at least this fraction of its rows is deleted
+_COMPACT_DELETED_FRACTION = 0.25
+# Rows copied per step while compacting
+_COMPACT_BLOCK_ROWS = 65536
+# Marks a fully written compacted copy, to be moved into place by the next writer
+_COMPACT_DONE = "COMPLETE"
+
+
+def _read_npy_header(path: Path) -> Optional[Tuple[Tuple[int, ...], Any]]:
+    """(shape, dtype) of a .npy file, or None while a writer is still creating it"""
+    with open(path, 'rb') as f:
+        if len(f.read(_NPY_HEADER_BYTES)) < _NPY_HEADER_BYTES:
+            return None
+        f.seek(0)
+        np.lib.format.read_magic(f)
+        shape, _, dtype = np.lib.format.read_array_header_1_0(f)
+    return shape, dtype
+
+
+class AppendableArray:
+    """
+    A .npy file that grows along its first axis.
+    The header is padded to a fixed size and rewritten in place on append, so the
+    file stays a regular .npy that np.load(mmap_mode='r') can map.
+    """
+
+    def __init__(self, path: Path, dtype: str, row_shape: Tuple[int, ...] = ()):
+        self.path = Path(path)
+        self.dtype = np.dtype(dtype)
+        self.row_shape = tuple(row_shape)
+        self.rows = 0
+        if self.path.exists():
+            self.rows = self._read_rows()
+        self._mapped = None
+        self._mapped_rows = -1
+
+    def _header(self, rows: int) -> bytes:
+        header = {
+            'descr': np.lib.format.dtype_to_descr(self.dtype),
+            'fortran_order': False,
+            'shape': (rows,) + self.row_shape,
+        }
+        text = repr(header).encode('latin1')
+        prefix = np.lib.format.magic(1, 0)
+        # magic (8 bytes) + uint16 header length, then the dict padded with spaces and a newline
+        body_len = _NPY_HEADER_BYTES - len(prefix) - 2
+        text = text.ljust(body_len - 1) + b'\n'
+        return prefix + body_len.to_bytes(2, 'little') + text
+
+    def _read_rows(self) -> int:
+        header = _read_npy_header(self.path)
+        if header is None:
+            return 0
+        shape, dtype = header
+        if dtype != self.dtype or tuple(shape[1:]) != self.row_shape:
+            raise ValueError(f"{self.path} holds {dtype}{shape}, expected {self.dtype}{self.row_shape}")
+        return shape[0]
+
+    @property
+    def row_bytes(self) -> int:
+        return self.dtype.itemsize * int(np.prod(self.row_shape, dtype=np.int64))
+
+    def append(self, values):
+        values = np.ascontiguousarray(values, dtype=self.dtype).reshape((-1,) + self.row_shape)
+        if not values.shape[0]:
+            return
+        mode = 'r+b' if self.path.exists() else 'w+b'
+        with open(self.path, mode) as f:
+            if mode == 'w+b':
+                f.write(self._header(0))
+            # Write after the rows the header counts, over anything an interrupted append left
+            f.seek(_NPY_HEADER_BYTES + self.rows * self.row_bytes)
+            f.truncate()
+            f.write(values.tobytes())
+            self.rows += values.shape[0]
+            f.seek(0)
+            f.write(self._header(self.rows))
+
+    def trim(self) -> bool:
+        """Cut the file back to self.rows; returns True if there was anything past them"""
+        if not self.path.exists():
+            return False
+        end = _NPY_HEADER_BYTES + self.rows * self.row_bytes
+        if self.path.stat().st_size <= end and self._read_rows() == self.rows:
+            return False
+        with open(self.path, 'r+b') as f:
+            f.truncate(end)
+            f.write(self._header(self.rows))
+        self._mapped_rows = -1
+        return True
+
+    def set_rows(self, indices: Iterable[int], value):
+        """Overwrite the given rows in place with one value, opening the file once"""
+        row = np.asarray(value, dtype=self.dtype).reshape(self.row_shape).tobytes()
+        with open(self.path, 'r+b') as f:
+            for index in indices:
+                f.seek(_NPY_HEADER_BYTES + index * len(row))
+                f.write(row)
+
+    def view(self):
+        """
+        Read-only memory map of the current rows (re-mapped when the row count
+        changes). Rows in the file past self.rows are not included.
+        """
+        if self._mapped_rows != self.rows:
+            if self.rows:
+                self._mapped = np.load(self.path, mmap_mode='r')[:self.rows]
+            else:
+                self._mapped = np.empty((0,) + self.row_shape, dtype=self.dtype)
+            self._mapped_rows = self.rows
+        return self._mapped
+
+    def refresh(self):
+        """Pick up rows appended by another process"""
+        if self.path.exists():
+            self.rows = self._read_rows()
+
+
+class LocalVectorStore(VectorStore):
+    """
+    Shared document storage for the local backends.
+
+    Documents are appended to documents.jsonl with their byte offsets in an
+    appendable .npy, so a document is read with one seek. Deleted and replaced
+    rows are tombstoned in a mask until compact() rewrites the live rows. The
+    id -> row map is saved by persist(), so opening the store never parses
+    documents.jsonl beyond the rows added since. Subclasses provide the
+    vector index.
+
+    Opening is read-only. Every write runs under _write_lock(), which also
+    brings this store up to date with other writers first.
+    """
+
+    def __init__(self, persist_directory: str, embedding_function):
+        if not HAS_NUMPY:
+            raise ImportError("numpy not installed. Install with: pip install numpy")
+        self.persist_directory = Path(persist_directory)
+        self.persist_directory.mkdir(parents=True, exist_ok=True)
+        self._embedding = embedding_function
+        self._docs_path = self.persist_directory / "documents.jsonl"
+        self._ids_path = self.persist_directory / "ids.pkl"
+        self._lock_path = self.persist_directory / "write.lock"
+        self._lock_depth = 0
+        if (self.persist_directory / "compact" / _COMPACT_DONE).exists():
+            # The files may be half old and half compacted: wait for (or stand in for) the writer
+            with self._write_lock():
+                pass
+        else:
+            self._open()
+
+    @property
+    def embeddings(self):
+        return self._embedding
+
+    def _open(self):
+        """Map the files, up to the rows all of them hold; nothing is written"""
+        self._offsets = AppendableArray(self.persist_directory / "offsets.npy", 'int64')
+        self._deleted = AppendableArray(self.persist_directory / "deleted.npy", 'uint8')
+        self._id_rows: Optional[Dict[str, int]] = None
+        self._ids_dirty = False
+        self._open_index()
+        self._limit_rows()
+        self._count_deleted()
+        self._stamp = self._file_stamp()
+
+    def _limit_rows(self):
+        """Ignore rows not every file holds yet: a writer is appending them, or crashed doing so"""
+        rows = min(self._offsets.rows, self._deleted.rows, self._index_rows())
+        self._offsets.rows = self._deleted.rows = rows
+        self._limit_index(rows)
+
+    def _count_deleted(self):
+        # Kept up to date by _tombstone, so searches and len() never scan the mask
+        self._n_deleted = int(np.count_nonzero(self._deleted.view()))
+
+    # -- writing --
+
+    @contextmanager
+    def _write_lock(self):
+        """
+        Hold the store's exclusive write lock (re-entrant). On taking it, a
+        compaction a crashed writer left complete is moved into place, the
+        store is reopened if another process changed its files, and anything
+        past the rows every file holds is cut off.
+        """
+        if self._lock_depth:
+            yield
+            return
+        with open(self._lock_path, 'a') as lock:
+            if HAS_FCNTL:
+                # Released when the file is closed
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                if self._finish_compaction() or getattr(self, '_stamp', None) != self._file_stamp():
+                    self._open()
+                self._trim()
+                yield
+            finally:
+                self._lock_depth -= 1
+                self._stamp = self._file_stamp()
+
+    def _stamped_paths(self) -> List[Path]:
+        return [self._docs_path, self.persist_directory / "offsets.npy", self.persist_directory / "deleted.npy"]
+
+    def _file_stamp(self) -> Tuple:
+        """Size and mtime of the store's files, to notice writes by other processes"""
+        stamp = []
+        for path in self._stamped_paths():
+            try:
+                stat = path.stat()
+                stamp.append((stat.st_size, stat.st_mtime_ns))
+            except FileNotFoundError:
+                stamp.append(None)
+        return tuple(stamp)
+
+    def _trim(self):
+        """Cut every file back to the rows all of them hold (after a crash mid-append)"""
+        rows = self._offsets.rows
+        trimmed = [self._offsets.trim(), self._deleted.trim(), self._trim_index()]
+
+        end = 0
+        if rows:
+            with open(self._docs_path, 'rb') as f:
+                f.seek(int(self._offsets.view()[rows - 1]))
+                f.readline()
+                end = f.tell()
+        if self._docs_path.exists() and self._docs_path.stat().st_size > end:
+            with open(self._docs_path, 'r+b') as f:
+                f.truncate(end)
+            trimmed.append(True)
+        if any(trimmed):
+            logger.warning(f"Discarded an incomplete write to {self.persist_directory}")
+
+    # -- document storage --
+
+    def _row_ids(self) -> Dict[str, int]:
+        """
+        id -> live row, loaded lazily on the first write, delete or lookup from
+        the map saved by persist(); only rows added after it are read from
+        documents.jsonl.
+        """
+        if self._id_rows is None:
+            id_rows, covered = {}, 0
+            if self._ids_path.exists():
+                with open(self._ids_path, 'rb') as f:
+                    saved = pickle.load(f)
+                # A map covering rows that were trimmed away is stale
+                if saved['rows'] <= self._offsets.rows:
+                    id_rows, covered = saved['ids'], saved['rows']
+            if covered < self._offsets.rows:
+                with open(self._docs_path, 'rb') as f:
+                    f.seek(int(self._offsets.view()[covered]))
+                    for row in range(covered, self._offsets.rows):
+                        id_rows[json.loads(f.readline())['id']] = row
+                self._ids_dirty = True
+            deleted = self._deleted.view()
+            self._id_rows = {doc_id: row for doc_id, row in id_rows.items() if not deleted[row]}
+        return self._id_rows
+
+    def _save_ids(self):
+        if not self._ids_dirty or self._id_rows is None:
+            return
+        tmp_path = self._ids_path.with_suffix('.tmp')
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({'rows': self._offsets.rows, 'ids': self._id_rows}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self._ids_path)
+        self._ids_dirty = False
+
+    def _append_documents(self, ids: List[str], texts: List[str], metadatas: List[Dict]) -> int:
+        """Append document records; returns the first new row"""
+        first_row = self._offsets.rows
+        offsets = []
+        with open(self._docs_path, 'ab') as f:
+            for doc_id, text, metadata in zip(ids, texts, metadatas):
+                offsets.append(f.tell())
+                record = {'id': doc_id, 'text': text, 'metadata': metadata}
+                f.write(json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n')
+        self._offsets.append(offsets)
+        self._deleted.append(np.zeros(len(ids), dtype=np.uint8))
+        return first_row
+
+    def _tombstone(self, rows: List[int]):
+        deleted = self._deleted.view()
+        rows = [row for row in rows if not deleted[row]]
+        if rows:
+            self._deleted.set_rows(rows, 1)
+            self._n_deleted += len(rows)
+
+    def _read_documents(self, rows: List[int]) -> List[Document]:
+        if not rows:
+            return []
+        offsets = self._offsets.view()
+        documents = []
+        with open(self._docs_path, 'rb') as f:
+            for row in rows:
+                f.seek(int(offsets[row]))
+                record = json.loads(f.readline())
+                documents.append(Document(page_content=record['text'], metadata=record['metadata'], id=record['id']))
+        return documents
+
+    def _live_mask(self):
+        return self._deleted.view() == 0
+
+    # -- VectorStore interface --
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[Dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        """Embed and add texts; existing IDs are replaced (upsert)"""
+        texts = list(texts)
+        if not texts:
+            return []
+        metadatas = list(metadatas) if metadatas else [{} for _ in texts]
+        if ids is None:
+            start = self._offsets.rows
+            ids = [f"doc-{start + i}" for i in range(len(texts))]
+        ids = list(ids)
+
+        # Embedding is the slow part and happens before the lock is taken
+        vectors = np.asarray(self._embedding.embed_documents(texts), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms > 0, norms, 1.0)
+
+        with self._write_lock():
+            row_ids = self._row_ids()
+            self._tombstone([row_ids[doc_id] for doc_id in ids if doc_id in row_ids])
+            first_row = self._append_documents(ids, texts, metadatas)
+            self._add_vectors(vectors, first_row)
+            for i, doc_id in enumerate(ids):
+                row_ids[doc_id] = first_row + i
+            self._ids_dirty = True
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if not ids:
+            return False
+        with self._write_lock():
+            row_ids = self._row_ids()
+            rows = [row_ids.pop(doc_id) for doc_id in ids if doc_id in row_ids]
+            self._tombstone(rows)
+            self._ids_dirty = True
+            self._on_delete(rows)
+        return True
+
+    def get_by_ids(self, ids: List[str]) -> List[Document]:
+        """Documents for the given IDs (unknown IDs are skipped)"""
+        row_ids = self._row_ids()
+        return self._read_documents([row_ids[doc_id] for doc_id in ids if doc_id in row_ids])
+
+    def delete_collection(self):
+        """Remove every file of the store and start empty"""
+        shutil.rmtree(self.persist_directory, ignore_errors=True)
+        self.persist_directory.mkdir(parents=True, exist_ok=True)
+        self._open()
+
+    def persist(self):
+        """
+        Save state that is not written on every add (called after an index
+        update), compacting first if enough rows are deleted.
+        """
+        with self._write_lock():
+            deleted = self._deleted.rows - len(self)
+            if deleted and deleted >= _COMPACT_DELETED_FRACTION * self._deleted.rows:
+                self.compact()
+            self._save_ids()
+
+    def compact(self):
+        """
+        Rewrite the store without its deleted rows.
+        The compacted copy is written to a subdirectory and moved into place
+        only once complete; an interrupted move is finished by the next writer.
+        """
+        with self._write_lock():
+            self._compact()
+
+    def _compact(self):
+        live = np.flatnonzero(self._live_mask())
+        if len(live) == self._deleted.rows:
+            return
+        logger.info(f"Compacting {self.persist_directory}: keeping {len(live)} of {self._deleted.rows} rows")
+
+        target = self.persist_directory / "compact"
+        shutil.rmtree(target, ignore_errors=True)
+        target.mkdir()
+        offsets = AppendableArray(target / "offsets.npy", 'int64')
+        id_rows = {}
+        with open(target / "documents.jsonl", 'wb') as out:
+            for start in range(0, len(live), _COMPACT_BLOCK_ROWS):
+                block = live[start:start + _COMPACT_BLOCK_ROWS]
+                block_offsets = []
+                for row, document in zip(block, self._read_documents(block.tolist())):
+                    block_offsets.append(out.tell())
+                    id_rows[document.id] = start + len(block_offsets) - 1
+                    record = {'id': document.id, 'text': document.page_content, 'metadata': document.metadata}
+                    out.write(json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n')
+                offsets.append(block_offsets)
+        AppendableArray(target / "deleted.npy", 'uint8').append(np.zeros(len(live), dtype=np.uint8))
+        with open(target / "ids.pkl", 'wb') as f:
+            pickle.dump({'rows': len(live), 'ids': id_rows}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        self._compact_index(target, live)
+        (target / _COMPACT_DONE).touch()
+
+        self._finish_compaction()
+        self._open()
+
+    def _finish_compaction(self) -> bool:
+        """
+        Move a complete compacted copy into place, or discard an incomplete one
+        (called under the write lock). Returns True if files were replaced.
+        """
+        target = self.persist_directory / "compact"
+        if not target.exists():
+            return False
+        moved = (target / _COMPACT_DONE).exists()
+        if moved:
+            for path in target.iterdir():
+                if path.name != _COMPACT_DONE:
+                    os.replace(path, self.persist_directory / path.name)
+            self._on_compacted()
+        shutil.rmtree(target, ignore_errors=True)
+        return moved
+
+    def refresh(self):
+        """Pick up documents added by another process since this store was opened"""
+        self._offsets.refresh()
+        self._deleted.refresh()
+        self._refresh_index()
+        self._limit_rows()
+        self._count_deleted()
+        self._id_rows = None
+
+    def __len__(self) -> int:
+        return self._deleted.rows - self._n_deleted
+
+    def _embed_query(self, query: str):
+        vector = np.asarray(self._embedding.embed_query(query), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        """Top-k documents with cosine similarity scores (higher is closer)"""
+        return self.similarity_search_with_score_by_vector(self._embed_query(query), k)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        vector = vector / norm if norm > 0 else vector
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(vector, k)]
+
+    def similarity_search_with_score_by_vector(self, vector, k: int = 4) -> List[Tuple[Document, float]]:
+        rows, scores = self._search(vector, k)
+        return list(zip(self._read_documents(rows), scores))
+
+    def _select_relevance_score_fn(self):
+        # Scores are cosine similarities in [-1, 1]
+        return lambda score: (score + 1.0) / 2.0
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding,
+        metadatas: Optional[List[Dict]] = None,
+        ids: Optional[List[str]] = None,
+        persist_directory: str = ".vector_index",
+        **kwargs: Any,
+    ):
+        store = cls(persist_directory=persist_directory, embedding_function=embedding, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
+
+    # -- index hooks --
+
+    def _open_index(self):
+        pass
+
+    def _refresh_index(self):
+        pass
+
+    def _index_rows(self) -> int:
+        """Rows the index holds"""
+        raise NotImplementedError
+
+    def _limit_index(self, rows: int):
+        """Use only the first rows of the index"""
+        raise NotImplementedError
+
+    def _trim_index(self) -> bool:
+        """Cut the index files back to the rows in use; returns True if anything was cut"""
+        raise NotImplementedError
+
+    def _compact_index(self, target: Path, live_rows):
+        """Write the index files for the given rows into target"""
+        raise NotImplementedError
+
+    def _on_compacted(self):
+        """Called once compacted files have been moved into place"""
+
+    def _add_vectors(self, vectors, first_row: int):
+        raise NotImplementedError
+
+    def _on_delete(self, rows: List[int]):
+        pass
+
+    def _search(self, vector, k: int) -> Tuple[List[int], List[float]]:
+        raise NotImplementedError
+
+
+class NumpyVectorStore(LocalVectorStore):
+    """Brute-force cosine search over a memory-mapped float32 matrix"""
+
+    def _open_index(self):
+        self._vectors: Optional[AppendableArray] = None
+        vectors_path = self.persist_directory / "vectors.npy"
+        header = _read_npy_header(vectors_path) if vectors_path.exists() else None
+        if header is not None:
+            self._vectors = AppendableArray(vectors_path, 'float32', header[0][1:])
+
+    def _index_rows(self) -> int:
+        return self._vectors.rows if self._vectors is not None else 0
+
+    def _limit_index(self, rows: int):
+        if self._vectors is not None:
+            self._vectors.rows = rows
+
+    def _trim_index(self) -> bool:
+        return self._vectors.trim() if self._vectors is not None else False
+
+    def _stamped_paths(self) -> List[Path]:
+        return super()._stamped_paths() + [self.persist_directory / "vectors.npy"]
+
+    def _compact_index(self, target: Path, live_rows):
+        if self._vectors is None:
+            return
+        vectors = AppendableArray(target / "vectors.npy", 'float32', self._vectors.row_shape)
+        matrix = self._vectors.view()
+        for start in range(0, len(live_rows), _COMPACT_BLOCK_ROWS):
+            vectors.append(matrix[live_rows[start:start + _COMPACT_BLOCK_ROWS]])
+
+    def _add_vectors(self, vectors, first_row: int):
+        if self._vectors is None:
+            self._vectors = AppendableArray(self.persist_directory / "vectors.npy", 'float32', vectors.shape[1:])
+        if first_row != self._vectors.rows:
+            raise RuntimeError(f"Vector rows out of step with documents: {self._vectors.rows} != {first_row}")
+        self._vectors.append(vectors)
+
+    def _refresh_index(self):
+        if self._vectors is not None:
+            self._vectors.refresh()
+        else:
+            self._open_index()
+
+    def _search(self, vector, k: int) -> Tuple[List[int], List[float]]:
+        if self._vectors is None or not self._vectors.rows:
+            return [], []
+        scores = self._vectors.view() @ vector
+        return _top_k(scores, self._live_mask(), k)
+
+    def search_by_vectors(self, vectors, k: int = 4) -> List[List[Tuple[Document, float]]]:
+        """Top-k for many query vectors with a single matrix product"""
+        if self._vectors is None or not self._vectors.rows:
+            return [[] for _ in vectors]
+        queries = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms > 0, norms, 1.0)
+        scores = self._vectors.view() @ queries.T
+        live = self._live_mask()
+        results = []
+        for column in range(scores.shape[1]):
+            rows, top_scores = _top_k(scores[:, column], live, k)
+            results.append(list(zip(self._read_documents(rows), top_scores)))
+        return results
+
+
+def _top_k(scores, live, k: int) -> Tuple[List[int], List[float]]:
+    """Indices and scores of the k best live rows, best first"""
+    scores = np.where(live, scores, -np.inf)
+    k = min(k, int(live.sum()))
+    if k <= 0:
+        return [], []
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return top.tolist(), scores[top].astype(float).tolist()
+
+
+class FaissHNSWVectorStore(NumpyVectorStore):
+    """
+    Approximate cosine search with a FAISS HNSW graph.
+
+    The memory-mapped matrix stays the source of truth: the graph is saved by
+    persist() and, when opened behind the matrix (a crash, or a new M), it is
+    caught up or rebuilt from the matrix in memory, without re-embedding
+    anything, until the next persist() saves it. HNSW cannot remove vectors,
+    so deleted rows are filtered out of an oversampled candidate list.
+    """
+
+    def __init__(
+        self,
+        persist_directory: str,
+        embedding_function,
+        m: int = 32,
+        ef_search: int = 64,
+        ef_construction: int = 200,
+    ):
+        if not HAS_FAISS:
+            raise ImportError("faiss not installed. Install with: pip install faiss-cpu")
+        self.m = m
+        self.ef_search = ef_search
+        self.ef_construction = ef_construction
+        # M is fixed when the graph is built, so each M gets its own file
+        self._index_path = Path(persist_directory) / f"hnsw-m{m}.faiss"
+        super().__init__(persist_directory, embedding_function)
+
+    def _open(self):
+        super()._open()
+        self._load_index()
+
+    def _new_index(self, dimensions: int):
+        index = faiss.IndexHNSWFlat(dimensions, self.m, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = self.ef_construction
+        return index
+
+    def _load_index(self):
+        self._index = None
+        self._dirty = False
+        if self._vectors is None:
+            return
+        if self._index_path.exists():
+            self._index = faiss.read_index(str(self._index_path))
+        self._catch_up_index()
+
+    def _catch_up_index(self):
+        """Add the matrix rows the graph is missing (FAISS labels are matrix rows)"""
+        if self._index is None:
+            self._index = self._new_index(self._vectors.row_shape[0])
+        missing = self._vectors.rows - self._index.ntotal
+        if missing > 0:
+            logger.info(f"Adding {missing} vectors to the HNSW graph")
+            self._index.add(np.ascontiguousarray(self._vectors.view()[self._index.ntotal:]))
+            self._dirty = True
+
+    def _trim_index(self) -> bool:
+        trimmed = super()._trim_index()
+        # A graph with rows the matrix does not hold cannot drop them: rebuild.
+        # Until then searches skip labels past the matrix
+        if self._index is not None and self._index.ntotal > self._vectors.rows:
+            self._index = None
+            self._catch_up_index()
+            trimmed = True
+        return trimmed
+
+    def _on_compacted(self):
+        # Graph labels are the old row numbers; _load_index rebuilds from the compacted matrix
+        for path in self.persist_directory.glob("hnsw-m*.faiss"):
+            path.unlink()
+
+    def _add_vectors(self, vectors, first_row: int):
+        super()._add_vectors(vectors, first_row)
+        if self._index is None:
+            self._index = self._new_index(vectors.shape[1])
+        self._index.add(vectors)
+        self._dirty = True
+
+    def persist(self):
+        with self._write_lock():
+            super().persist()
+            if self._dirty and self._index is not None:
+                tmp_path = self._index_path.with_suffix('.tmp')
+                faiss.write_index(self._index, str(tmp_path))
+                os.replace(tmp_path, self._index_path)
+                self._dirty = False
+
+    def refresh(self):
+        super().refresh()
+        if self._vectors is not None:
+            self._catch_up_index()
+
+    def _search_graph(self, queries, k: int) -> List[Tuple[List[int], List[float]]]:
+        """
+        Top-k live rows per query, widening the candidate list past tombstones.
+        Only the returned labels are checked against the mask; with no
+        tombstones nothing is checked at all.
+        """
+        k = min(k, len(self))
+        if k <= 0 or self._index is None:
+            return [([], []) for _ in range(len(queries))]
+
+        rows_visible = self._deleted.rows
+        deleted = self._deleted.view() if self._n_deleted else None
+        # Tombstoned rows, and graph rows past the matrix this store can see, are skipped
+        n_skipped = self._n_deleted + max(0, self._index.ntotal - rows_visible)
+        results = [None] * len(queries)
+        pending = list(range(len(queries)))
+        fetch = min(self._index.ntotal, k + min(n_skipped, 4 * k))
+        while pending:
+            # Per-call parameters: the index is shared by concurrent queries
+            params = faiss.SearchParametersHNSW(efSearch=max(self.ef_search, fetch))
+            scores, labels = self._index.search(np.ascontiguousarray(queries[pending]), fetch, params=params)
+            still_pending = []
+            for position, query in enumerate(pending):
+                rows, top_scores = [], []
+                for label, score in zip(labels[position], scores[position]):
+                    # Labels past the matrix belong to rows this store cannot see yet
+                    if 0 <= label < rows_visible and (deleted is None or not deleted[label]):
+                        rows.append(int(label))
+                        top_scores.append(float(score))
+                        if len(rows) == k:
+                            break
+                if len(rows) < k and fetch < self._index.ntotal:
+                    still_pending.append(query)
+                else:
+                    results[query] = (rows, top_scores)
+            pending = still_pending
+            fetch = min(self._index.ntotal, fetch * 2)
+        return results
+
+    def _search(self, vector, k: int) -> Tuple[List[int], List[float]]:
+        return self._search_graph(np.asarray(vector, dtype=np.float32).reshape(1, -1), k)[0]
+
+    def search_by_vectors(self, vectors, k: int = 4) -> List[List[Tuple[Document, float]]]:
+        """Top-k for many query vectors in one FAISS call"""
+        queries = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms > 0, norms, 1.0)
+        return [
+            list(zip(self._read_documents(rows), scores))
+            for rows, scores in self._search_graph(queries, k)
+        ]
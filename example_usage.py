@@ -128,21 +128,22 @@ def main():
     successful_queries = 0
     failed_queries = 0
     
-    for i, question in enumerate(questions, 1):
-        try:
-            print(f"\n{'='*70}")
-            print(f"Question {i}/{len(questions)}")
-            print(f"{'='*70}")
-            
-            result = chatbot.query(question)
-            print(chatbot.format_response(result))
-            successful_queries += 1
-            
-        except Exception as e:
+    # Questions are answered concurrently; results keep the input order
+    results = chatbot.query_many(questions, max_concurrency=4)
+
+    for i, (question, result) in enumerate(zip(questions, results), 1):
+        print(f"\n{'='*70}")
+        print(f"Question {i}/{len(questions)}")
+        print(f"{'='*70}")
+
+        if result.metadata and result.metadata.get('error'):
             print(f"\n Error processing question: {question}")
-            print(f"   Error details: {str(e)}")
+            print(f"   Error details: {result.metadata['error']}")
             failed_queries += 1
             continue
+
+        print(chatbot.format_response(result))
+        successful_queries += 1
     
     # Summary
     print("\n" + "="*70)
@@ -11,6 +11,8 @@ import re
 from pathlib import Path
 from collections import defaultdict
 
+from chatbot.text_cache import PageTextCache, HAS_PDF_LIB
+
 try:
     import networkx as nx
     import matplotlib.pyplot as plt
@@ -22,29 +24,18 @@ except ImportError:
 
 
 def extract_text_from_file(file_path):
-    """Extract text from PDF files"""
+    """Extract text from PDF files (through the page text cache shared with the chatbot)"""
     
     p = Path(file_path)
     suffix = p.suffix.lower()
 
     if suffix == '.pdf':
-        try:
-            from PyPDF2 import PdfReader
-        except ImportError:
-            print("Warning: PyPDF2 not installed. Install with: pip3 install PyPDF2")
+        if not HAS_PDF_LIB:
+            print("Warning: pypdf or PyPDF2 not installed. Install with: pip3 install pypdf")
             return ""
         try:
-            reader = PdfReader(str(file_path))
-            text_chunks = []
-            for page_num, page in enumerate(reader.pages):
-                try:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text_chunks.append(page_text)
-                except Exception as e:
-                    print(f"Warning: Could not extract text from page {page_num}")
-                    continue
-            return "\n".join(text_chunks)
+            pages = PageTextCache().get_pages(str(file_path))
+            return "\n".join(page for page in pages if page)
         except Exception as e:
             print(f"Error extracting text from PDF {file_path}: {e}")
             return ""
@@ -0,0 +1,120 @@
+"""
+Tests for chatbot.answer_cache.
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict
+
+import pytest
+
+from chatbot import answer_cache
+from chatbot.answer_cache import AnswerCache, normalize_question
+
+
+@dataclass
+class Response:
+    answer: str
+    metadata: Dict = field(default_factory=dict)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(answer_cache, "time", clock)
+    return clock
+
+
+def test_normalize_question():
+    assert normalize_question("  What dose  was USED?? ") == "what dose was used"
+
+
+def test_hit_returns_a_tagged_copy(clock):
+    cache = AnswerCache()
+    response = Response("2 mg/kg", {'sources': ["a.pdf"]})
+    cache.put("What dose was used?", response)
+
+    hit = cache.get("what dose was used")
+
+    assert hit.answer == "2 mg/kg"
+    assert hit.metadata == {'sources': ["a.pdf"], 'cache': {'match': 'exact', 'similarity': 1.0}}
+    assert response.metadata == {'sources': ["a.pdf"]}
+    assert (cache.hits, cache.misses) == (1, 0)
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = AnswerCache(ttl_seconds=60)
+    cache.put("q", Response("a"))
+
+    clock.now += 60
+    assert cache.get_exact("q") is not None
+    clock.now += 1
+    assert cache.get_exact("q") is None
+    assert len(cache) == 1
+    assert cache.get("q") is None
+    assert len(cache) == 0
+    assert cache.misses == 1
+
+
+def test_put_restarts_the_ttl(clock):
+    cache = AnswerCache(ttl_seconds=60)
+    cache.put("q", Response("old"))
+    clock.now += 50
+    cache.put("q", Response("new"))
+    clock.now += 50
+    assert cache.get("q").answer == "new"
+
+
+def test_no_ttl_never_expires(clock):
+    cache = AnswerCache(ttl_seconds=None)
+    cache.put("q", Response("a"))
+    clock.now += 10 ** 9
+    assert cache.get("q").answer == "a"
+
+
+def test_least_recently_used_entries_are_evicted(clock):
+    cache = AnswerCache(max_entries=3)
+    for question in ("q1", "q2", "q3"):
+        cache.put(question, Response(question))
+
+    # Reading q1 and re-putting q2 make q3 the least recently used
+    assert cache.get("q1") is not None
+    cache.put("q2", Response("q2 again"))
+    cache.put("q4", Response("q4"))
+
+    assert len(cache) == 3
+    assert cache.get("q3") is None
+    assert [cache.get(q).answer for q in ("q1", "q2", "q4")] == ["q1", "q2 again", "q4"]
+
+    # get_exact also counts as a use
+    cache.get_exact("q1")
+    cache.put("q5", Response("q5"))
+    assert cache.get_exact("q2") is None and cache.get_exact("q1") is not None
+
+
+def test_near_duplicates_match_above_threshold(clock):
+    pytest.importorskip("numpy")
+    cache = AnswerCache(similarity_threshold=0.95)
+    cache.put("CBD dose in dogs?", Response("2 mg/kg"), vector=[1.0, 0.0])
+
+    hit = cache.get("How much CBD for dogs?", vector=[0.99, 0.05])
+    assert hit.answer == "2 mg/kg" and hit.metadata['cache']['match'] == 'semantic'
+    assert cache.get("CBD dose in cats?", vector=[0.6, 0.8]) is None
+
+    # Expired near-duplicates are dropped, not returned
+    clock.now += 3601
+    assert cache.get("How much CBD for dogs?", vector=[0.99, 0.05]) is None
+    assert len(cache) == 0
+
+
+def test_semantic_matching_is_off_by_default(clock):
+    cache = AnswerCache()
+    cache.put("CBD dose in dogs?", Response("2 mg/kg"), vector=[1.0, 0.0])
+    assert cache.get("How much CBD for dogs?", vector=[1.0, 0.0]) is None
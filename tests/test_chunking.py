@@ -0,0 +1,169 @@
+"""
+Equivalence tests for chatbot.chunking.
+
+ReferenceChunker is the string-concatenating Chunker the offset-based engine
+replaced, frozen verbatim. Every strategy, and the chunk text ChunkCorpus
+materialises from spans, must match it exactly on randomised inputs.
+"""
+
+import random
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import pytest
+
+from chatbot.chunking import Chunker, ChunkCorpus
+
+CASES = 3000
+STRATEGIES = ["sentence_aware", "semantic", "hybrid"]
+
+
+class ReferenceChunker:
+    """Text chunking strategies (the original implementation)"""
+
+    @staticmethod
+    def sentence_aware_split(text: str, chunk_size: int = 500, overlap: int = 100) -> List[str]:
+        sentences = re.split(r'(?<=[.!?])\s+', text)
+        chunks = []
+        current_chunk = ""
+
+        for sentence in sentences:
+            if len(current_chunk) + len(sentence) < chunk_size:
+                current_chunk += " " + sentence
+            else:
+                if current_chunk:
+                    chunks.append(current_chunk.strip())
+                current_chunk = sentence
+
+        if current_chunk:
+            chunks.append(current_chunk.strip())
+
+        # Add overlap
+        if overlap > 0:
+            overlapped_chunks = []
+            for i, chunk in enumerate(chunks):
+                if i > 0:
+                    # Add end of previous chunk
+                    prev_chunk_end = chunks[i-1][-overlap:] if len(chunks[i-1]) > overlap else chunks[i-1]
+                    overlapped_chunks.append(prev_chunk_end + " " + chunk)
+                else:
+                    overlapped_chunks.append(chunk)
+            chunks = overlapped_chunks
+
+        return chunks
+
+    @staticmethod
+    def semantic_split(text: str, chunk_size: int = 500) -> List[str]:
+        sections = re.split(r'\n\n+', text)
+        chunks = []
+        current_chunk = ""
+
+        for section in sections:
+            if len(current_chunk) + len(section) < chunk_size:
+                current_chunk += "\n\n" + section
+            else:
+                if current_chunk:
+                    chunks.append(current_chunk.strip())
+                current_chunk = section
+
+        if current_chunk:
+            chunks.append(current_chunk.strip())
+
+        return chunks
+
+    @staticmethod
+    def hybrid_split(text: str, chunk_size: int = 500, overlap: int = 100) -> List[str]:
+        sections = re.split(r'\n\n+', text)
+        chunks = []
+
+        for section in sections:
+            sentences = re.split(r'(?<=[.!?])\s+', section)
+            current_chunk = ""
+
+            for sentence in sentences:
+                if len(current_chunk) + len(sentence) < chunk_size:
+                    current_chunk += " " + sentence
+                else:
+                    if current_chunk:
+                        chunks.append(current_chunk.strip())
+                    current_chunk = sentence
+
+            if current_chunk:
+                chunks.append(current_chunk.strip())
+
+        return chunks
+
+
+def reference_split(text: str, strategy: str, chunk_size: int, overlap: int) -> List[str]:
+    """The chunks RAGChatbot produced for one page with the original Chunker"""
+    if strategy == "sentence_aware":
+        return ReferenceChunker.sentence_aware_split(text, chunk_size, overlap)
+    if strategy == "semantic":
+        return ReferenceChunker.semantic_split(text, chunk_size)
+    return ReferenceChunker.hybrid_split(text, chunk_size, overlap)
+
+
+# Words, sentence punctuation, and every kind of whitespace the boundaries care about
+_TOKENS = (
+    ["cannabis", "CBD", "e.g.", "dose", "mg/kg", "3.5", "dogs", "a", ""]
+    + [".", "!", "?", "...", "?!"]
+    + [" ", "  ", "\t", "\n", "\n\n", "\n\n\n", " \n\n ", ".\n\n", ". ", "! \n"]
+)
+
+
+def random_text(rng: random.Random) -> str:
+    length = rng.choice([0, 1, 5, 20, 100, 400])
+    text = "".join(rng.choice(_TOKENS) for _ in range(length))
+    # Leading and trailing separators are edge cases for split() and strip()
+    return rng.choice(["", " ", "\n\n", ". "]) + text + rng.choice(["", " ", "\n\n", ". ", "."])
+
+
+def random_params(rng: random.Random):
+    chunk_size = rng.choice([-5, 0, 1, 2, 10, 37, 100, 500])
+    overlap = rng.choice([-3, 0, 1, 5, 20, 100, 1000])
+    return chunk_size, overlap
+
+
+@pytest.mark.parametrize("strategy", STRATEGIES)
+def test_strategies_match_reference(strategy):
+    rng = random.Random(f"strategies-{strategy}")
+    for _ in range(CASES):
+        text = random_text(rng)
+        chunk_size, overlap = random_params(rng)
+        if strategy == "sentence_aware":
+            actual = Chunker.sentence_aware_split(text, chunk_size, overlap)
+        elif strategy == "semantic":
+            actual = Chunker.semantic_split(text, chunk_size)
+        else:
+            actual = Chunker.hybrid_split(text, chunk_size, overlap)
+        assert actual == reference_split(text, strategy, chunk_size, overlap), (text, chunk_size, overlap)
+
+
+@pytest.mark.parametrize("strategy", STRATEGIES)
+def test_corpus_text_matches_reference(strategy):
+    rng = random.Random(f"corpus-{strategy}")
+    for _ in range(CASES // 10):
+        chunk_size, overlap = random_params(rng)
+        pages = [random_text(rng) for _ in range(rng.randint(1, 6))]
+        corpus = ChunkCorpus(strategy, chunk_size, overlap)
+        for page, text in enumerate(pages):
+            corpus.add_page(text, "doc.pdf", page)
+
+        expected = [chunk for text in pages for chunk in reference_split(text, strategy, chunk_size, overlap)]
+        assert [corpus.text(i) for i in range(len(corpus))] == expected, (pages, chunk_size, overlap)
+
+
+def test_parallel_add_pages_matches_serial():
+    rng = random.Random("parallel")
+    pages = [(random_text(rng), f"doc{i // 3}.pdf", i % 3) for i in range(60)]
+    serial = ChunkCorpus("sentence_aware", 50, 10)
+    serial.add_pages(pages)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        parallel = ChunkCorpus("sentence_aware", 50, 10)
+        parallel.add_pages(pages, executor, workers=4)
+
+    assert len(parallel) == len(serial)
+    for i in range(len(serial)):
+        assert parallel.text(i) == serial.text(i)
+        assert parallel.metadata(i) == serial.metadata(i)
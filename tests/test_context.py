@@ -0,0 +1,97 @@
+"""
+Tests for chatbot.context.
+"""
+
+import pytest
+
+from chatbot.context import assemble_context, join_overlapping, pack_context, source_tag
+
+
+@pytest.mark.parametrize("source, tag", [
+    ("pdfs/20250822_153032_U09133S6Q58_elucidating_interplay_between_myrcene_and.21.pdf",
+     "elucidating-interplay-between-my"),
+    ("pdfs/20250827_181543_U098FN77CL9_s41598-023-36220-2.pdf", "s41598-023-36220-2"),
+    ("20251021_114506_U09DQ4QQAFN_B024_-_CBDa_and_Full-Spectrum_-_Cannabinoids_in_Animals.pdf",
+     "B024-CBDa-and-Full-Spectrum-Cann"),
+    ("20250822_153032_U09133S6Q58_eluc p2.pdf", "eluc-p2"),
+    ("docs/cbd dogs study.pdf", "cbd-dogs-study"),
+    ("notes_2024.txt", "notes-2024"),
+])
+def test_source_tag_strips_upload_prefix(source, tag):
+    assert source_tag({'source': source}) == tag
+    assert source_tag({'source': source, 'page': 3}) == f"{tag} p3"
+
+
+def test_source_tag_without_source():
+    assert source_tag({'page': 0}) == "unknown p0"
+
+
+# -- join_overlapping / pack_context --
+
+# Consecutive chunks share chunk_overlap characters, longer than the overlap probe
+SHARED = "CBD was given to dogs twice daily at 2 mg/kg for four weeks with food. "
+
+
+def make_doc(text, **metadata):
+    Document = pytest.importorskip("langchain_core.documents").Document
+    return Document(page_content=text, metadata={'source': "a.pdf", 'page': 1, **metadata})
+
+
+@pytest.mark.parametrize("first, second, joined", [
+    ("Methods. " + SHARED, SHARED + "Results.", "Methods. " + SHARED + "Results."),
+    ("Methods. " + SHARED + "Results.", "given to dogs", "Methods. " + SHARED + "Results."),
+    # Overlaps shorter than the probe are not trusted
+    ("Methods. CBD was given", "CBD was given to dogs", "Methods. CBD was given CBD was given to dogs"),
+    ("CBD was given to dogs.", "Cats were not studied.", "CBD was given to dogs. Cats were not studied."),
+    ("x" * 10 + "y" * 100, "y" * 100 + "z" * 10, "x" * 10 + "y" * 100 + "z" * 10),
+])
+def test_join_overlapping(first, second, joined):
+    assert join_overlapping(first, second) == joined
+
+
+def test_pack_context_merges_consecutive_chunks_and_drops_duplicates():
+    docs = [
+        make_doc(SHARED + "Results.", chunk=1),
+        make_doc("Methods. " + SHARED, chunk=0),
+        make_doc(" Methods.  " + SHARED.replace(" ", "\n", 1), chunk=0),
+        make_doc("Horses were fine.", chunk=5),
+        make_doc("Plasma levels rose.", page=2, chunk=2),
+    ]
+
+    packed = pack_context(docs, max_tokens=1000, count_tokens=len)
+
+    assert [doc.page_content for doc in packed] == [
+        "Methods. " + SHARED + "Results.", "Horses were fine.", "Plasma levels rose.",
+    ]
+    assert packed[0].metadata['chunks'] == [0, 1]
+    assert 'chunks' not in packed[1].metadata
+
+
+def test_pack_context_skips_blocks_over_budget_for_smaller_ones():
+    docs = [
+        make_doc("a" * 40, chunk=0),
+        make_doc("b" * 50, chunk=10),
+        make_doc("c" * 15, chunk=20),
+        make_doc("d" * 10, chunk=30),
+    ]
+
+    packed = pack_context(docs, max_tokens=60, count_tokens=len)
+
+    assert [doc.page_content[0] for doc in packed] == ["a", "c"]
+    assert sum(len(doc.page_content) for doc in packed) <= 60
+
+
+def test_pack_context_truncates_the_most_relevant_block():
+    docs = [make_doc("a" * 100, chunk=0), make_doc("b" * 10, chunk=5)]
+
+    packed = pack_context(docs, max_tokens=40, count_tokens=len)
+
+    assert [doc.page_content for doc in packed] == ["a" * 40]
+    assert packed[0].metadata['chunk'] == 0
+
+
+def test_assemble_context_without_budget_only_tags():
+    docs = [make_doc("CBD was given to dogs", chunk=0), make_doc("CBD was given to dogs", chunk=0)]
+    tagged = assemble_context(docs)
+    assert len(tagged) == 2
+    assert tagged[0].metadata['source_tag'] == "a p1"
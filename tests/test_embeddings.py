@@ -0,0 +1,88 @@
+"""
+Tests for batched query embedding in chatbot.embeddings.
+"""
+
+import pytest
+
+from chatbot.embeddings import BatchedEmbeddings, CachedEmbeddings, embed_queries
+
+
+class FakeModel:
+    """Records every request; texts containing "bad" fail, alone or in a batch"""
+
+    def __init__(self):
+        self.requests = []
+
+    def _vector(self, text):
+        return [float(len(text)), 1.0]
+
+    def embed_documents(self, texts):
+        self.requests.append(list(texts))
+        if any("bad" in text for text in texts):
+            raise ValueError("rejected input")
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class OpenAIEmbeddings(FakeModel):
+    """Named like the OpenAI model, whose queries embed exactly like documents"""
+
+
+class AsymmetricModel(FakeModel):
+    def embed_query(self, text):
+        self.requests.append(("query", text))
+        if "bad" in text:
+            raise ValueError("rejected input")
+        return self._vector(text)
+
+
+QUESTIONS = [f"question {i}" for i in range(10)]
+
+
+def test_symmetric_model_embeds_all_queries_in_one_request():
+    model = OpenAIEmbeddings()
+    assert embed_queries(model, QUESTIONS) == [model._vector(q) for q in QUESTIONS]
+    assert model.requests == [QUESTIONS]
+
+
+def test_asymmetric_model_embeds_each_query_as_a_query():
+    model = AsymmetricModel()
+    assert embed_queries(model, QUESTIONS) == [model._vector(q) for q in QUESTIONS]
+    assert sorted(model.requests) == sorted(("query", q) for q in QUESTIONS)
+
+
+def test_batch_failure_falls_back_to_one_query_at_a_time():
+    model = OpenAIEmbeddings()
+    questions = ["first", "bad one", "third"]
+
+    vectors = embed_queries(model, questions, return_exceptions=True)
+
+    assert vectors[0] == model._vector("first") and vectors[2] == model._vector("third")
+    assert isinstance(vectors[1], ValueError)
+    assert model.requests[0] == questions and len(model.requests) == 4
+    with pytest.raises(ValueError):
+        embed_queries(OpenAIEmbeddings(), questions)
+
+
+def test_scheduler_batches_queries_through_embed_documents():
+    model = OpenAIEmbeddings()
+    batched = BatchedEmbeddings(model, max_batch_size=4, max_in_flight=1)
+    assert embed_queries(batched, QUESTIONS) == [model._vector(q) for q in QUESTIONS]
+    assert model.requests == [QUESTIONS[:4], QUESTIONS[4:8], QUESTIONS[8:]]
+
+
+def test_cache_keeps_the_vectors_of_a_partly_failed_batch(tmp_path):
+    model = OpenAIEmbeddings()
+    embeddings = BatchedEmbeddings(CachedEmbeddings(model, cache_path=str(tmp_path / "cache.sqlite3")))
+    questions = ["first", "bad one", "third"]
+
+    vectors = embed_queries(embeddings, questions, return_exceptions=True)
+
+    assert isinstance(vectors[1], ValueError)
+    # One batch, then one request per text inside the cache; the outer retry
+    # only asks the model again for the failed text
+    assert model.requests == [questions, ["first"], ["bad one"], ["third"], ["bad one"]]
+    assert embed_queries(embeddings, ["first", "third"]) == [model._vector("first"), model._vector("third")]
+    assert len(model.requests) == 5
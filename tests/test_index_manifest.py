@@ -0,0 +1,173 @@
+"""
+Tests for chatbot.index_manifest and the incremental re-index in RAGChatbot.update_index.
+"""
+
+import os
+
+import pytest
+
+from chatbot import index_manifest
+from chatbot.index_manifest import IndexManifest, file_sha256
+
+PARAMS = {'chunking_strategy': "hybrid", 'chunk_size': 500, 'chunk_overlap': 100, 'chunk_unit': "chars"}
+
+
+def write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+    return str(path)
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    return IndexManifest(str(tmp_path / "index"))
+
+
+def test_diff_classifies_files(manifest):
+    manifest.update("a.pdf", "sha-a", PARAMS, ["a-0"])
+    manifest.update("b.pdf", "sha-b", PARAMS, ["b-0"])
+    manifest.update("c.pdf", "sha-c", PARAMS, ["c-0"])
+
+    diff = manifest.diff({"a.pdf": "sha-a", "b.pdf": "sha-b2", "d.pdf": "sha-d"}, PARAMS)
+
+    assert diff.unchanged == ["a.pdf"]
+    assert diff.changed == ["b.pdf"]
+    assert diff.added == ["d.pdf"]
+    assert diff.removed == ["c.pdf"]
+    assert diff.to_index == ["d.pdf", "b.pdf"]
+    assert manifest.chunk_ids_for(diff.changed + diff.removed) == ["b-0", "c-0"]
+
+
+def test_diff_marks_files_changed_when_chunking_params_change(manifest):
+    manifest.update("a.pdf", "sha-a", PARAMS, ["a-0"])
+    diff = manifest.diff({"a.pdf": "sha-a"}, {**PARAMS, 'chunk_size': 800})
+    assert diff.changed == ["a.pdf"]
+
+
+def test_diff_against_nothing_on_disk_removes_everything(manifest):
+    manifest.update("a.pdf", "sha-a", PARAMS, ["a-0"])
+    manifest.update("b.pdf", "sha-b", PARAMS, ["b-0"])
+
+    diff = manifest.diff({}, PARAMS)
+
+    assert diff.removed == ["a.pdf", "b.pdf"]
+    assert not diff.added and not diff.changed and not diff.unchanged
+
+
+def test_diff_of_empty_manifest_and_directory_is_empty(manifest):
+    assert manifest.diff({}, PARAMS).is_empty
+
+
+def test_save_and_load_round_trip(tmp_path, manifest):
+    path = write(tmp_path / "docs" / "a.txt", "alpha")
+    manifest.settings = {'embedding_model': "local-hashing"}
+    hashes = manifest.file_hashes([path])
+    manifest.update(path, hashes[path], PARAMS, ["a-0", "a-1"])
+    manifest.save()
+
+    loaded = IndexManifest(str(tmp_path / "index"))
+    assert loaded.settings == {'embedding_model': "local-hashing"}
+    assert loaded.entries == manifest.entries
+    assert loaded.entries[path].size == 5
+
+
+def test_file_hashes_skips_files_with_unchanged_stat(tmp_path, manifest, monkeypatch):
+    paths = [write(tmp_path / "docs" / f"{name}.txt", name) for name in ("a", "b")]
+    hashes = manifest.file_hashes(paths)
+    for path in paths:
+        manifest.update(path, hashes[path], PARAMS, [])
+
+    hashed = []
+    monkeypatch.setattr(index_manifest, "file_sha256", lambda path: hashed.append(path) or file_sha256(path))
+
+    assert manifest.file_hashes(paths) == hashes
+    assert hashed == []
+
+    # Rewritten with new content: re-hashed and reported as changed
+    write(tmp_path / "docs" / "b.txt", "bb")
+    current = manifest.file_hashes(paths)
+    assert hashed == [paths[1]]
+    assert manifest.diff(current, PARAMS).changed == [paths[1]]
+
+
+def test_file_hashes_records_touched_files(tmp_path, manifest, monkeypatch):
+    path = write(tmp_path / "docs" / "a.txt", "alpha")
+    manifest.update(path, manifest.file_hashes([path])[path], PARAMS, [])
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    hashes = manifest.file_hashes([path])
+    assert manifest.diff(hashes, PARAMS).unchanged == [path]
+    assert manifest.stats_updated
+    manifest.save()
+    assert not manifest.stats_updated
+
+    hashed = []
+    monkeypatch.setattr(index_manifest, "file_sha256", lambda path: hashed.append(path) or file_sha256(path))
+    IndexManifest(str(tmp_path / "index")).file_hashes([path])
+    assert hashed == []
+
+
+# -- RAGChatbot.update_index --
+
+@pytest.fixture
+def make_chatbot(tmp_path):
+    pytest.importorskip("numpy")
+    pytest.importorskip("langchain")
+    from chatbot.rag_chatbot import RAGChatbot
+
+    def make(documents_dir, force_rebuild=False):
+        chatbot = RAGChatbot(
+            documents_dir=str(documents_dir),
+            vector_store_dir=str(tmp_path / "index"),
+            embedding_model="local-hashing-64",
+            embedding_cache_dir=None,
+            vector_store_type="numpy",
+            page_cache_dir=str(tmp_path / "page_cache"),
+            hybrid_search=False,
+            llm_base_url="http://127.0.0.1:9/v1",
+        )
+        chatbot.setup(force_rebuild=force_rebuild)
+        return chatbot
+    return make
+
+
+@pytest.fixture
+def indexed(tmp_path, make_chatbot):
+    docs = tmp_path / "docs"
+    for name in ("dogs", "cats", "horses"):
+        write(docs / f"{name}.txt", f"CBD was given to {name}. " * 40)
+    chatbot = make_chatbot(docs)
+    assert len(chatbot.vector_store) > 0
+    return docs, len(chatbot.vector_store)
+
+
+def test_update_index_removes_deleted_files(tmp_path, make_chatbot, indexed):
+    docs, chunks = indexed
+    os.remove(docs / "cats.txt")
+
+    chatbot = make_chatbot(docs)
+
+    assert sorted(chatbot.manifest.entries) == [str(docs / "dogs.txt"), str(docs / "horses.txt")]
+    assert 0 < len(chatbot.vector_store) < chunks
+
+
+def test_missing_documents_dir_keeps_the_index(tmp_path, make_chatbot, indexed):
+    docs, chunks = indexed
+    chatbot = make_chatbot(tmp_path / "no_such_dir")
+
+    assert len(chatbot.vector_store) == chunks
+    assert len(chatbot.manifest.entries) == 3
+    assert chatbot.qa_chain is not None
+
+
+def test_empty_documents_dir_keeps_the_index(tmp_path, make_chatbot, indexed):
+    docs, chunks = indexed
+    empty = tmp_path / "empty"
+    empty.mkdir()
+
+    assert len(make_chatbot(empty).vector_store) == chunks
+    # force_rebuild is the way to really start over from an empty directory
+    rebuilt = make_chatbot(empty, force_rebuild=True)
+    assert len(rebuilt.vector_store) == 0
+    assert not rebuilt.manifest.entries
@@ -0,0 +1,149 @@
+"""
+Tests for BM25 scoring and reciprocal rank fusion in chatbot.retrieval.
+"""
+
+import math
+from collections import Counter
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from chatbot.embeddings import tokenize
+from chatbot.retrieval import STOP_WORDS, BM25Index, reciprocal_rank_fusion
+
+CORPUS = {
+    "c0": "CBD was given to dogs at 2 mg/kg twice daily.",
+    "c1": "Plasma CBDa levels in dogs were higher than CBD levels.",
+    "c2": "Horses showed no side effects at the tested dose.",
+    "c3": "GC-MS identified myrcene and other terpenes in the extract.",
+    "c4": "Myrcene may contribute to the entourage effect of cannabinoids.",
+    "c5": "Cats absorbed CBD more slowly than dogs.",
+    "c6": "The study of the effect of the dose of the extract.",
+}
+
+
+def reference_bm25(corpus, query, k1=1.5, b=0.75):
+    """Okapi BM25 written out term by term"""
+    docs = {doc_id: Counter(t for t in tokenize(text) if t not in STOP_WORDS) for doc_id, text in corpus.items()}
+    avg_length = sum(sum(c.values()) for c in docs.values()) / len(docs)
+    scores = {}
+    for term in {t for t in tokenize(query) if t not in STOP_WORDS}:
+        df = sum(1 for counts in docs.values() if term in counts)
+        if not df:
+            continue
+        idf = math.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+        for doc_id, counts in docs.items():
+            tf = counts.get(term, 0)
+            if tf:
+                length = sum(counts.values())
+                score = idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / avg_length))
+                scores[doc_id] = scores.get(doc_id, 0.0) + score
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def build_index(corpus, path=None):
+    index = BM25Index(path)
+    index.add(list(corpus), list(corpus.values()))
+    return index
+
+
+def assert_same_ranking(actual, expected, k=10):
+    assert [doc_id for doc_id, _ in actual] == [doc_id for doc_id, _ in expected][:k]
+    for (_, score), (_, expected_score) in zip(actual, expected):
+        assert score == pytest.approx(expected_score, rel=1e-5)
+
+
+@pytest.mark.parametrize("query", [
+    "CBD dogs", "myrcene terpenes GC-MS", "2 mg/kg", "side effects in horses", "the effect of the dose",
+])
+def test_bm25_matches_reference_scores(query):
+    assert_same_ranking(build_index(CORPUS).search(query, k=10), reference_bm25(CORPUS, query))
+
+
+def test_bm25_keeps_identifiers_whole_and_ignores_stop_words():
+    index = build_index(CORPUS)
+    assert [doc_id for doc_id, _ in index.search("GC-MS")] == ["c3"]
+    assert [doc_id for doc_id, _ in index.search("mg/kg")] == ["c0"]
+    assert index.search("the of and") == []
+    assert index.search("unknownterm") == []
+
+
+def test_bm25_search_returns_at_most_k():
+    assert len(build_index(CORPUS).search("CBD dogs cats myrcene dose", k=2)) == 2
+
+
+def test_bm25_remove_replace_and_compact():
+    index = build_index(CORPUS)
+    index.remove(["c1", "missing"])
+    index.add(["c5"], ["Cats tolerated myrcene well."])
+
+    found = [doc_id for doc_id, _ in index.search("CBD dogs cats myrcene", k=10)]
+    assert "c1" not in found and found.count("c5") == 1
+    assert len(index) == 6
+
+    # After compaction document frequencies no longer count removed chunks
+    expected_corpus = {**{k: v for k, v in CORPUS.items() if k != "c1"}, "c5": "Cats tolerated myrcene well."}
+    index.compact()
+    assert_same_ranking(index.search("cats myrcene", k=10), reference_bm25(expected_corpus, "cats myrcene"))
+
+
+def test_bm25_save_and_load(tmp_path):
+    path = str(tmp_path / "bm25.pkl")
+    index = build_index(CORPUS, path)
+    index.remove(["c0"])
+    index.save()
+
+    loaded = BM25Index(path)
+    assert sorted(loaded.doc_ids()) == sorted(set(CORPUS) - {"c0"})
+    assert loaded.search("CBD dogs", k=10) == index.search("CBD dogs", k=10)
+
+
+def test_reciprocal_rank_fusion_scores():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "a", "d"]], k=60)
+    scores = dict(fused)
+    assert scores["a"] == pytest.approx(1 / 61 + 1 / 62)
+    assert scores["c"] == pytest.approx(1 / 63 + 1 / 61)
+    assert scores["b"] == pytest.approx(1 / 62)
+    assert [key for key, _ in fused] == ["a", "c", "b", "d"]
+    assert reciprocal_rank_fusion([]) == []
+
+
+def test_fused_retriever_merges_dense_and_lexical(tmp_path):
+    pytest.importorskip("langchain_core")
+    from chatbot.embeddings import HashingEmbeddings
+    from chatbot.retrieval import FusedRetriever
+    from chatbot.vector_index import NumpyVectorStore
+
+    store = NumpyVectorStore(str(tmp_path / "store"), HashingEmbeddings(dimensions=64))
+    store.add_texts(list(CORPUS.values()), metadatas=[{'source': "doc.pdf"}] * len(CORPUS), ids=list(CORPUS))
+    lexical = build_index(CORPUS)
+    retriever = FusedRetriever(vector_store=store, lexical_index=lexical, k=3, fetch_k=4)
+    query = "GC-MS terpenes in dogs"
+
+    dense = [doc.id for doc in store.similarity_search(query, k=4)]
+    keyword = [doc_id for doc_id, _ in lexical.search(query, 4)]
+    expected = [key for key, _ in reciprocal_rank_fusion([dense, keyword])][:3]
+
+    docs = retriever.invoke(query)
+
+    assert [doc.id for doc in docs] == expected
+    assert all(doc.page_content == CORPUS[doc.id] for doc in docs)
+
+
+def test_fuse_reads_lexical_only_hits_from_the_store(tmp_path):
+    pytest.importorskip("langchain_core")
+    from chatbot.embeddings import HashingEmbeddings
+    from chatbot.retrieval import FusedRetriever
+    from chatbot.vector_index import NumpyVectorStore
+
+    store = NumpyVectorStore(str(tmp_path / "store"), HashingEmbeddings(dimensions=64))
+    store.add_texts(list(CORPUS.values()), ids=list(CORPUS))
+    retriever = FusedRetriever(vector_store=store, lexical_index=build_index(CORPUS), k=3)
+
+    dense = store.get_by_ids(["c2", "c4"])
+    docs = retriever.fuse(dense, [("c3", 5.0), ("c4", 2.0)])
+
+    # c4 is in both lists; c3 only came from BM25 and is read back by ID
+    assert [doc.id for doc in docs] == ["c4", "c2", "c3"]
+    assert docs[2].page_content == CORPUS["c3"]
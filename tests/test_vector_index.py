@@ -0,0 +1,190 @@
+"""
+Tests for the memory-mapped local vector stores in chatbot.vector_index.
+"""
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("langchain_core")
+
+from chatbot.embeddings import HashingEmbeddings
+from chatbot.vector_index import FaissHNSWVectorStore, LocalVectorStore, NumpyVectorStore, HAS_FAISS
+
+TOPICS = ["dogs", "cats", "horses", "myrcene", "terpenes", "plasma", "pain", "dose"]
+TEXTS = [f"CBD study {i} about {TOPICS[i % len(TOPICS)]} and {TOPICS[(i * 3) % len(TOPICS)]}" for i in range(40)]
+IDS = [f"chunk-{i}" for i in range(len(TEXTS))]
+
+STORES = [NumpyVectorStore]
+if HAS_FAISS:
+    STORES.append(FaissHNSWVectorStore)
+
+
+@pytest.fixture(params=STORES, ids=lambda cls: cls.__name__)
+def open_store(request, tmp_path):
+    embeddings = HashingEmbeddings(dimensions=64)
+
+    def make():
+        return request.param(persist_directory=str(tmp_path / "store"), embedding_function=embeddings)
+    return make
+
+
+def file_sizes(store):
+    return {path.name: path.stat().st_size for path in store.persist_directory.iterdir() if path.is_file()}
+
+
+def search_ids(store, query, k=5):
+    return [doc.id for doc in store.similarity_search(query, k=k)]
+
+
+def test_append_search_and_reopen(open_store):
+    store = open_store()
+    store.add_texts(TEXTS[:25], metadatas=[{'row': i} for i in range(25)], ids=IDS[:25])
+    store.add_texts(TEXTS[25:], metadatas=[{'row': i} for i in range(25, 40)], ids=IDS[25:])
+    store.persist()
+
+    assert len(store) == 40
+    assert search_ids(store, TEXTS[7], k=1) == ["chunk-7"]
+    assert [doc.metadata['row'] for doc in store.get_by_ids(["chunk-3", "missing", "chunk-31"])] == [3, 31]
+
+    reopened = open_store()
+    assert len(reopened) == 40
+    assert search_ids(reopened, "myrcene terpenes") == search_ids(store, "myrcene terpenes")
+
+
+def test_upsert_and_delete_tombstone_rows(open_store):
+    store = open_store()
+    store.add_texts(TEXTS, ids=IDS)
+    store.add_texts(["replacement text about horses"], ids=["chunk-0"])
+    store.delete(["chunk-1", "chunk-2", "no-such-id"])
+
+    assert len(store) == 38
+    assert store.get_by_ids(["chunk-0"])[0].page_content == "replacement text about horses"
+    assert store.get_by_ids(["chunk-1", "chunk-2"]) == []
+    found = search_ids(store, TEXTS[1], k=40)
+    assert "chunk-1" not in found and "chunk-2" not in found and len(found) == 38
+
+    # Tombstones and the id map survive a reopen without persist()
+    reopened = open_store()
+    assert len(reopened) == 38
+    assert reopened.get_by_ids(["chunk-0"])[0].page_content == "replacement text about horses"
+
+
+def test_tombstones_written_in_one_pass(open_store, monkeypatch):
+    store = open_store()
+    store.add_texts(TEXTS, ids=IDS)
+    calls = []
+    set_rows = type(store._deleted).set_rows
+    monkeypatch.setattr(type(store._deleted), "set_rows", lambda self, rows, value: calls.append(list(rows)) or set_rows(self, rows, value))
+
+    store.delete(IDS[:10])
+
+    assert calls == [list(range(10))]
+
+
+def simulate_interrupted_append(store):
+    """A writer that appended documents and offsets but died before the vectors"""
+    with store._write_lock():
+        store._append_documents(["partial-0", "partial-1"], ["half", "written"], [{}, {}])
+
+
+def test_open_ignores_rows_being_appended(open_store):
+    store = open_store()
+    store.add_texts(TEXTS, ids=IDS)
+    store.persist()
+    simulate_interrupted_append(store)
+    sizes = file_sizes(store)
+
+    reader = open_store()
+
+    assert len(reader) == 40
+    assert reader.get_by_ids(["partial-0"]) == []
+    assert search_ids(reader, TEXTS[5], k=1) == ["chunk-5"]
+    # Opening and searching wrote nothing
+    assert file_sizes(reader) == sizes
+
+
+def test_writer_trims_a_crashed_append(open_store):
+    store = open_store()
+    store.add_texts(TEXTS[:30], ids=IDS[:30])
+    store.persist()
+    simulate_interrupted_append(store)
+
+    writer = open_store()
+    writer.add_texts(TEXTS[30:], ids=IDS[30:])
+    writer.persist()
+
+    reopened = open_store()
+    assert len(reopened) == 40
+    assert reopened.get_by_ids(["partial-0", "partial-1"]) == []
+    assert reopened.get_by_ids(["chunk-35"])[0].page_content == TEXTS[35]
+    assert search_ids(reopened, TEXTS[35], k=1) == ["chunk-35"]
+    assert reopened._offsets.rows == reopened._deleted.rows == reopened._vectors.rows == 40
+
+
+def test_reader_picks_up_appends_on_refresh(open_store):
+    writer = open_store()
+    writer.add_texts(TEXTS[:20], ids=IDS[:20])
+    reader = open_store()
+
+    writer.add_texts(TEXTS[20:], ids=IDS[20:])
+    assert len(reader) == 20
+    reader.refresh()
+
+    assert len(reader) == 40
+    assert search_ids(reader, TEXTS[33], k=1) == ["chunk-33"]
+
+
+def test_persist_compacts_deleted_rows(open_store):
+    store = open_store()
+    store.add_texts(TEXTS, ids=IDS)
+    before = search_ids(store, "dogs and cats", k=8)
+    store.delete([doc_id for doc_id in IDS if doc_id not in before][:20])
+    store.persist()
+
+    assert store._deleted.rows == len(store) == 20
+    assert store._live_mask().all()
+    assert search_ids(store, "dogs and cats", k=8) == before
+
+    reopened = open_store()
+    assert reopened._deleted.rows == 20
+    assert search_ids(reopened, "dogs and cats", k=8) == before
+    assert not (reopened.persist_directory / "compact").exists()
+
+
+def test_small_deletes_do_not_compact(open_store):
+    store = open_store()
+    store.add_texts(TEXTS, ids=IDS)
+    store.delete(IDS[:5])
+    store.persist()
+    assert store._deleted.rows == 40 and len(store) == 35
+
+
+def test_interrupted_compaction_is_finished_before_the_store_is_used(open_store, monkeypatch):
+    store = open_store()
+    store.add_texts(TEXTS, ids=IDS)
+    store.delete(IDS[:20])
+    # Die after the compacted copy is complete, before it is moved into place
+    monkeypatch.setattr(LocalVectorStore, "_finish_compaction", lambda self: False)
+    store.compact()
+    monkeypatch.undo()
+    assert (store.persist_directory / "compact" / "COMPLETE").exists()
+
+    reopened = open_store()
+
+    assert not (reopened.persist_directory / "compact").exists()
+    assert reopened._deleted.rows == len(reopened) == 20
+    assert search_ids(reopened, TEXTS[25], k=1) == ["chunk-25"]
+    assert reopened.get_by_ids(["chunk-0"]) == []
+
+
+def test_incomplete_compaction_is_discarded(open_store):
+    store = open_store()
+    store.add_texts(TEXTS, ids=IDS)
+    (store.persist_directory / "compact").mkdir()
+    (store.persist_directory / "compact" / "documents.jsonl").write_text("half a copy")
+
+    assert len(open_store()) == 40
+    store.delete(["chunk-0"])
+
+    assert not (store.persist_directory / "compact").exists()
+    assert len(open_store()) == 39